@@ -0,0 +1,308 @@
+# src/benchmark.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from . import config
+from . import synthetic_pdf
+
+# A stage regresses when its throughput drops (or its peak RSS grows) by more than this
+DEFAULT_THRESHOLD = 0.10
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+# --- Stages ---
+# Each stage runs in a fresh process (so peak RSS is its own) and returns
+# its elapsed seconds plus the amounts of work it did.
+
+def _stage_layout(corpus: dict) -> dict:
+    from . import layout as document_layout
+    layouts, seconds = _timed(lambda: [
+        document_layout.extract_layout(path, use_cache=False) for path in corpus['pdf_paths']
+    ])
+    return {'seconds': seconds, 'pages': sum(l.n_pages for l in layouts), 'spans': sum(l.n_spans for l in layouts)}
+
+
+def _stage_features(corpus: dict) -> dict:
+    from . import layout as document_layout
+    layouts = [document_layout.extract_layout(path, use_cache=False) for path in corpus['pdf_paths']]
+    indices = [layout.non_empty_spans() for layout in layouts]
+    _, seconds = _timed(lambda: [layout.features(i) for layout, i in zip(layouts, indices)])
+    return {'seconds': seconds, 'spans': sum(len(i) for i in indices)}
+
+
+def _stage_classify(corpus: dict) -> dict:
+    from . import heading_classifier
+    from . import layout as document_layout
+    classifier = heading_classifier.get_classifier(config.MODEL_PATH)
+    matrices = []
+    for path in corpus['pdf_paths']:
+        layout = document_layout.extract_layout(path, use_cache=False)
+        matrices.append(layout.features(layout.non_empty_spans()))
+    _, seconds = _timed(lambda: [classifier.predict(matrix) for matrix in matrices])
+    return {'seconds': seconds, 'spans': sum(len(m) for m in matrices), 'predictions': sum(len(m) for m in matrices)}
+
+
+def _stage_process_pdfs(corpus: dict) -> dict:
+    from . import main
+    config.INPUT_DIR = corpus['pdf_dir']
+    config.OUTPUT_DIR = tempfile.mkdtemp(dir=corpus['work_dir'])
+    _, seconds = _timed(main.process_pdfs)
+    return {'seconds': seconds, 'pages': corpus['pages']}
+
+
+def _stage_parse_pdf_to_chunks(corpus: dict) -> dict:
+    from . import document_parser
+    chunks, seconds = _timed(lambda: [document_parser.parse_pdf_to_chunks(path) for path in corpus['pdf_paths']])
+    return {'seconds': seconds, 'pages': corpus['pages'], 'chunks': sum(len(c) for c in chunks)}
+
+
+def _stage_create_dataset(corpus: dict) -> dict:
+    from . import create_training_data
+    config.SAMPLES_DIR = corpus['pdf_dir']
+    config.TRAINING_DATA_PATH = os.path.join(tempfile.mkdtemp(dir=corpus['work_dir']), 'training_data.csv')
+    _, seconds = _timed(create_training_data.create_dataset)
+    return {'seconds': seconds, 'pages': corpus['pages']}
+
+
+def _stage_embed(corpus: dict) -> dict:
+    from . import document_parser
+    from . import main_1b
+    from . import semantic_analyzer
+    analyzer = semantic_analyzer.SemanticAnalyzer(main_1b.EMBEDDING_MODEL_PATH)  # No cache
+    texts = [chunk['content'] for path in corpus['pdf_paths'] for chunk in document_parser.parse_pdf_to_chunks(path)]
+    _, seconds = _timed(lambda: analyzer.encode(texts))
+    return {'seconds': seconds, 'chunks_embedded': len(texts)}
+
+
+def _stage_run_challenge_1b(corpus: dict) -> dict:
+    from . import main_1b
+    output_path = os.path.join(tempfile.mkdtemp(dir=corpus['work_dir']), 'output.json')
+    _, seconds = _timed(lambda: main_1b.run_challenge_1b(corpus['input_path'], output_path))
+    return {'seconds': seconds, 'pages': corpus['pages']}
+
+
+STAGES = {
+    'layout': _stage_layout,
+    'features': _stage_features,
+    'classify': _stage_classify,
+    'process_pdfs': _stage_process_pdfs,
+    'parse_pdf_to_chunks': _stage_parse_pdf_to_chunks,
+    'create_dataset': _stage_create_dataset,
+    'embed': _stage_embed,
+    'run_challenge_1b': _stage_run_challenge_1b,
+}
+
+# Stages that need sentence-transformers
+EMBEDDING_STAGES = {'embed', 'run_challenge_1b'}
+
+
+def _run_stage(name: str, corpus: dict, queue):
+    # Relative model paths (document_parser, main_1b) resolve against the project root
+    os.chdir(config.BASE_DIR)
+    # Measure cold runs: never reuse a cached layout, analysis or embedding
+    config.LAYOUT_CACHE_ENABLED = False
+    config.ANALYSIS_CACHE_ENABLED = False
+    config.EMBEDDING_CACHE_SIZE = 0
+    try:
+        result = STAGES[name](corpus)
+        result['peak_rss_mb'] = round(_peak_rss_mb(), 1)
+        queue.put(result)
+    except ImportError as e:
+        queue.put({'skipped': str(e)})
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def _wait_for_result(process, queue) -> dict:
+    """
+    The result a stage process puts on `queue`, or an error if the process
+    dies without one (e.g. killed by the OOM killer or a segfault).
+    """
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            if process.is_alive():
+                continue
+        # The process has exited; its result may still be in flight
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            return {'error': f"stage process exited with code {process.exitcode}"}
+
+
+def _with_rates(result: dict) -> dict:
+    seconds = result['seconds']
+    for unit in ('pages', 'spans', 'chunks', 'predictions', 'chunks_embedded'):
+        if unit in result and seconds > 0:
+            result[f"{unit}_per_sec"] = round(result[unit] / seconds, 1)
+    result['seconds'] = round(seconds, 4)
+    return result
+
+
+def build_corpus(work_dir: str, documents: int, **options) -> dict:
+    """
+    Generates a synthetic corpus plus a Challenge 1B input over it.
+    """
+    pdf_dir = os.path.join(work_dir, 'PDFs')
+    pdf_paths = synthetic_pdf.generate_corpus(pdf_dir, documents, **options)
+    input_path = os.path.join(work_dir, 'challenge1b_input.json')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "documents": [{"filename": os.path.basename(path)} for path in pdf_paths],
+            "persona": {"role": "Project Manager"},
+            "job_to_be_done": {"task": "Summarize the testing and release planning sections."},
+        }, f, indent=4)
+    return {
+        'work_dir': work_dir,
+        'pdf_dir': pdf_dir,
+        'pdf_paths': pdf_paths,
+        'input_path': input_path,
+        'pages': documents * options.get('pages', 10),
+    }
+
+
+def run(output_path: str, documents: int = 3, stages: list = None, **options) -> dict:
+    """
+    Times every stage on a freshly generated corpus and saves the results as
+    JSON. A stage that raises or crashes is recorded as {'error': ...}.
+    """
+    stages = stages or list(STAGES)
+    work_dir = tempfile.mkdtemp(prefix='pdf-benchmark-')
+    context = multiprocessing.get_context('spawn')
+    try:
+        corpus = build_corpus(work_dir, documents, **options)
+        results = {}
+        for name in stages:
+            queue = context.Queue()
+            process = context.Process(target=_run_stage, args=(name, corpus, queue))
+            process.start()
+            result = _wait_for_result(process, queue)
+            process.join()
+            results[name] = result if 'skipped' in result or 'error' in result else _with_rates(result)
+            if 'error' in result:
+                summary = f"FAILED: {result['error']}"
+            else:
+                summary = result.get('skipped') or f"{results[name]['seconds']:.3f}s, {results[name]['peak_rss_mb']} MB peak"
+            print(f"{name:>20}: {summary}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'documents': documents,
+            **options,
+        },
+        'stages': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"Benchmark results saved to {output_path}")
+    return report
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Lists regressions of `current` against `baseline`: any per-second rate
+    that dropped, or peak RSS that grew, by more than `threshold`, and any
+    stage that failed in `current`.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['stages']
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)['stages']
+
+    regressions = []
+    for stage, before in baseline.items():
+        after = current.get(stage)
+        if after is not None and 'error' in after:
+            print(f"{stage:>20}: FAILED: {after['error']}")
+            regressions.append((stage, 'error', None, None))
+            continue
+        if after is None or 'skipped' in before or 'skipped' in after or 'error' in before:
+            continue
+        for metric, old in before.items():
+            new = after.get(metric)
+            if new is None or not old:
+                continue
+            if metric.endswith('_per_sec'):
+                change = new / old - 1
+                regressed = change < -threshold
+            elif metric == 'peak_rss_mb':
+                change = new / old - 1
+                regressed = change > threshold
+            else:
+                continue
+            flag = 'REGRESSION' if regressed else 'ok'
+            print(f"{stage:>20} {metric:>22}: {old:>12.1f} -> {new:>12.1f} ({change:+.1%}) {flag}")
+            if regressed:
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the PDF pipelines on synthetic documents.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="generate a corpus and time every stage")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--documents', type=int, default=3)
+    run_parser.add_argument('--pages', type=int, default=50)
+    run_parser.add_argument('--heading-density', type=float, default=0.15)
+    run_parser.add_argument('--font-variety', type=int, default=2)
+    run_parser.add_argument('--words-per-page', type=int, default=350)
+    run_parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="run only these stages")
+    run_parser.add_argument('--skip-embedding', action='store_true', help="skip stages that need the embedding model")
+
+    compare_parser = commands.add_parser('compare', help="flag regressions against a stored baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    generate_parser = commands.add_parser('generate', help="only write a synthetic corpus")
+    generate_parser.add_argument('directory')
+    generate_parser.add_argument('--documents', type=int, default=3)
+    generate_parser.add_argument('--pages', type=int, default=50)
+    generate_parser.add_argument('--heading-density', type=float, default=0.15)
+    generate_parser.add_argument('--font-variety', type=int, default=2)
+    generate_parser.add_argument('--words-per-page', type=int, default=350)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        if compare(args.baseline, args.current, args.threshold):
+            raise SystemExit(1)
+    else:
+        options = dict(pages=args.pages, heading_density=args.heading_density,
+                       font_variety=args.font_variety, words_per_page=args.words_per_page)
+        if args.command == 'generate':
+            paths = synthetic_pdf.generate_corpus(args.directory, args.documents, **options)
+            print(f"Generated {len(paths)} PDFs in {args.directory}")
+        else:
+            stages = args.stages or [s for s in STAGES if not (args.skip_embedding and s in EMBEDDING_STAGES)]
+            report = run(args.output, args.documents, stages, **options)
+            if any('error' in result for result in report['stages'].values()):
+                raise SystemExit(1)
@@ -0,0 +1,151 @@
+# src/bm25.py
+
+import argparse
+import json
+import os
+import re
+import numpy as np
+from scipy import sparse
+
+from . import config
+from . import ranking
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Frequent words that carry no topic; dropped from documents and queries
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i in is it its of on or that the this to was were will with
+you your we our they their he she his her them which who what when where how all any can do does into
+not no so than then there these those also more most such some only very about over after before
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of texts.
+
+    The per-term BM25 weights of every document are precomputed into a
+    sparse term-by-document matrix, so scoring a query is one sparse
+    row-sum over its terms.
+    """
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        self.vocabulary = {}
+        rows, cols, counts = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float64)
+        for doc, text in enumerate(texts):
+            term_counts = {}
+            for token in tokenize(text):
+                term = self.vocabulary.setdefault(token, len(self.vocabulary))
+                term_counts[term] = term_counts.get(term, 0) + 1
+            lengths[doc] = sum(term_counts.values())
+            rows.extend(term_counts)
+            cols.extend([doc] * len(term_counts))
+            counts.extend(term_counts.values())
+        self.n_docs = len(texts)
+
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        tf = np.array(counts, dtype=np.float64)
+        document_frequency = np.bincount(rows, minlength=len(self.vocabulary))
+        idf = np.log1p((self.n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if self.n_docs and lengths.mean() > 0 else 1.0
+        weights = idf[rows] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[cols] / average_length))
+        self.weights = sparse.csr_matrix(
+            (weights, (rows, cols)), shape=(len(self.vocabulary), self.n_docs)
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every document for `query` (repeated query terms count repeatedly).
+        """
+        terms = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        if not terms:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        query_counts = np.bincount(terms, minlength=len(self.vocabulary))
+        return np.asarray(self.weights.T @ query_counts, dtype=np.float64).ravel()
+
+    def top_k(self, query: str, k: int) -> np.ndarray:
+        """
+        Indices of the k best documents for `query`, best first.
+        """
+        return ranking.top_k(self.scores(query), k)
+
+
+def chunk_text(chunk: dict) -> str:
+    """
+    What the lexical index sees of a chunk: its heading and its content.
+    """
+    return f"{chunk['parent_heading']} {chunk['content']}"
+
+
+def candidate_pool(chunks: list, queries: list, size: int) -> np.ndarray:
+    """
+    Sorted indices of the chunks worth embedding: the union over `queries`
+    of each query's `size` best chunks by BM25.
+    """
+    if size <= 0 or len(chunks) <= size:
+        return np.arange(len(chunks))
+    index = BM25Index([chunk_text(chunk) for chunk in chunks])
+    selected = set()
+    for query in queries:
+        selected.update(index.top_k(query, size).tolist())
+    return np.array(sorted(selected), dtype=np.int64)
+
+
+def _recall(full: list, prefiltered: list) -> float:
+    full, prefiltered = set(full), set(prefiltered)
+    return len(full & prefiltered) / len(full) if full else 1.0
+
+
+def evaluate(pool_sizes: list, k: int = 10):
+    """
+    Recall@k of the prefiltered rankings against the full-embedding ranking
+    (for both extracted sections and subsections) on the bundled
+    collections, and the share of chunks that still reach the model.
+    """
+    from . import main_1b
+    from . import semantic_analyzer
+
+    collections_dir = os.path.join(config.BASE_DIR, 'Challenge_1b')
+    analyzer = semantic_analyzer.SemanticAnalyzer(main_1b.EMBEDDING_MODEL_PATH)
+    print(f"{'collection':>14} {'pool':>6} {'embedded':>10} {'sections@' + str(k):>12} {'subsections@' + str(k):>15}")
+    for folder_name in sorted(os.listdir(collections_dir)):
+        input_path = os.path.join(collections_dir, folder_name, 'challenge1b_input.json')
+        if not os.path.exists(input_path):
+            continue
+        with open(input_path, 'r') as f:
+            input_data = json.load(f)
+        pdf_folder = os.path.join(collections_dir, folder_name, 'PDFs')
+
+        full = main_1b.rank_collection_queries(input_data, pdf_folder, analyzer)
+        for size in pool_sizes:
+            stats = {}
+            prefiltered = main_1b.rank_collection_queries(
+                input_data, pdf_folder, analyzer, candidates=size, stats=stats
+            )
+            section_recall = np.mean([
+                _recall([(s['document'], s['section_title']) for s in a['extracted_sections'][:k]],
+                        [(s['document'], s['section_title']) for s in b['extracted_sections'][:k]])
+                for a, b in zip(full, prefiltered)
+            ])
+            subsection_recall = np.mean([
+                _recall([(s['document'], s['refined_text']) for s in a['subsection_analysis'][:k]],
+                        [(s['document'], s['refined_text']) for s in b['subsection_analysis'][:k]])
+                for a, b in zip(full, prefiltered)
+            ])
+            embedded = f"{stats['embedded']}/{stats['chunks']}"
+            print(f"{folder_name:>14} {size:>6} {embedded:>10} {section_recall:>12.0%} {subsection_recall:>15.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate the BM25 candidate prefilter against full embedding ranking.")
+    parser.add_argument('--pool', type=int, nargs='+', default=[50, 100, 200],
+                        help="candidate pool sizes to evaluate")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    evaluate(args.pool, args.k)
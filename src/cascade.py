@@ -0,0 +1,283 @@
+# src/cascade.py
+
+import argparse
+import json
+import os
+import numpy as np
+
+from . import config
+from . import feature_extractor
+from . import hashing
+from . import layout as document_layout
+
+# Candidate rules: a span is obviously body text if a feature lies beyond the
+# range seen on heading spans ("max": above it, "min": below it), optionally
+# only among spans matching `when`
+DEFAULT_RULES = [
+    {"feature": "text_length", "bound": "max"},
+    {"feature": "size_ratio", "bound": "min"},
+    {"feature": "text_length", "bound": "max", "when": {"is_bold": 0}},
+    {"feature": "size_ratio", "bound": "min", "when": {"is_bold": 0}},
+    {"feature": "size_ratio", "bound": "max", "when": {"is_bold": 0}},
+]
+
+_COLUMNS = {name: i for i, name in enumerate(feature_extractor.FEATURE_NAMES)}
+
+
+class Cascade:
+    """
+    Cheap pre-filter in front of the heading model: rows matched by any rule
+    are labeled Body without evaluating the model. Rules compare one feature
+    column (feature_extractor.FEATURE_NAMES order) with a learned threshold.
+    """
+
+    def __init__(self, rules: list, model_digest: str = None):
+        self.rules = rules
+        self.model_digest = model_digest
+
+    def body_mask(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        True for rows that are certainly body text.
+        """
+        mask = np.zeros(len(feature_matrix), dtype=bool)
+        for rule in self.rules:
+            values = feature_matrix[:, _COLUMNS[rule['feature']]]
+            hit = values > rule['threshold'] if rule['bound'] == 'max' else values < rule['threshold']
+            for name, value in (rule.get('when') or {}).items():
+                hit &= feature_matrix[:, _COLUMNS[name]] == value
+            mask |= hit
+        return mask
+
+    def save(self, path: str, report: dict = None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_digest, "rules": self.rules, "validation": report or {}}, f, indent=4)
+
+    @classmethod
+    def load(cls, path: str) -> 'Cascade':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['rules'], data.get('model'))
+
+
+def learn(protected: np.ndarray, rules: list = None, margin: float = None) -> list:
+    """
+    Thresholds for the candidate `rules` such that no `protected` row (any
+    span that is, or is predicted to be, a heading) is filtered: each bound
+    is the extreme value among the protected rows the rule applies to,
+    widened by a relative `margin`. Rules that apply to no protected row are
+    dropped, since nothing would bound them.
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    margin = config.HEADING_CASCADE_MARGIN if margin is None else margin
+    learned = []
+    for rule in rules:
+        rows = np.ones(len(protected), dtype=bool)
+        for name, value in (rule.get('when') or {}).items():
+            rows &= protected[:, _COLUMNS[name]] == value
+        if not rows.any():
+            continue
+        values = protected[rows, _COLUMNS[rule['feature']]]
+        if rule['bound'] == 'max':
+            threshold = float(values.max()) * (1 + margin)
+        else:
+            threshold = float(values.min()) * (1 - margin)
+        learned.append(dict(rule, threshold=threshold))
+    return learned
+
+
+def _labeled_samples() -> list:
+    """
+    Per sample PDF, (spans, labels, blocks): the feature rows of every
+    non-empty span with its ground-truth label (labeled as in
+    create_training_data), plus those of the block-leading spans the 1B
+    chunker classifies.
+    """
+    from . import create_training_data
+
+    documents = []
+    for pdf_path, json_path in create_training_data.labeled_sample_pdfs():
+        heading_lookup = create_training_data.load_heading_lookup(json_path)
+        layout = document_layout.extract_layout(pdf_path)
+        span_indices = layout.non_empty_spans()
+        labels = create_training_data.label_spans(heading_lookup, layout.page[span_indices], layout.texts(span_indices))
+        documents.append((
+            layout.features(span_indices),
+            np.array(labels, dtype=object),
+            layout.features(layout.block_starts()),
+        ))
+    return documents
+
+
+def _stack(documents: list) -> tuple:
+    n_columns = len(feature_extractor.FEATURE_NAMES)
+    if not documents:
+        return np.empty((0, n_columns)), np.empty(0, dtype=object), np.empty((0, n_columns))
+    spans, labels, blocks = zip(*documents)
+    return np.concatenate(spans), np.concatenate(labels), np.concatenate(blocks)
+
+
+def _protected(model, spans: np.ndarray, labels: np.ndarray, blocks: np.ndarray) -> np.ndarray:
+    """
+    Rows no rule may filter: true headings, and rows the model calls a heading.
+    """
+    from . import heading_classifier
+
+    rows = np.concatenate([spans, blocks])
+    predictions = np.asarray(model.predict(rows), dtype=object)
+    return np.concatenate([
+        spans[np.isin(labels, heading_classifier.HEADING_LABELS)],
+        rows[np.isin(predictions, heading_classifier.HEADING_LABELS)],
+    ])
+
+
+def _recall(labels: np.ndarray, predictions: np.ndarray) -> dict:
+    from . import heading_classifier
+
+    recall = {}
+    for level in heading_classifier.HEADING_LABELS:
+        relevant = labels == level
+        if relevant.any():
+            recall[level] = float(np.mean(predictions[relevant] == level))
+    return recall
+
+
+def _evaluate(cascade: Cascade, model, spans: np.ndarray, labels: np.ndarray, blocks: np.ndarray) -> tuple:
+    """
+    (rows, skipped rows, changed predictions, span predictions without and
+    with the cascade) of a cascade on some documents.
+    """
+    rows = np.concatenate([spans, blocks])
+    predictions = np.asarray(model.predict(rows), dtype=object)
+    skipped = cascade.body_mask(rows)
+    cascaded = np.where(skipped, config.LABELS[-1], predictions)
+    return (len(rows), int(skipped.sum()), int(np.sum(cascaded != predictions)),
+            predictions[:len(spans)], cascaded[:len(spans)])
+
+
+def cross_validate(model, documents: list) -> dict:
+    """
+    Leave-one-document-out validation: for every sample PDF, a cascade is
+    learned from the other PDFs only and applied to the held-out one. Counts
+    the skipped rows and changed predictions, and compares H1-H3 recall
+    with and without the cascade, over all held-out documents.
+    """
+    rows = skipped = changed = 0
+    labels, plain, cascaded = [], [], []
+    for held_out in range(len(documents)):
+        rest = _stack(documents[:held_out] + documents[held_out + 1:])
+        cascade = Cascade(learn(_protected(model, *rest)))
+        spans, span_labels, blocks = documents[held_out]
+        n_rows, n_skipped, n_changed, predictions, with_cascade = _evaluate(cascade, model, spans, span_labels, blocks)
+        rows, skipped, changed = rows + n_rows, skipped + n_skipped, changed + n_changed
+        labels.append(span_labels)
+        plain.append(predictions)
+        cascaded.append(with_cascade)
+    labels, plain, cascaded = (np.concatenate(parts) if parts else np.empty(0, dtype=object)
+                               for parts in (labels, plain, cascaded))
+    return {
+        "folds": len(documents),
+        "rows": rows,
+        "skipped": skipped,
+        "changed_predictions": changed,
+        "recall": _recall(labels, plain),
+        "recall_with_cascade": _recall(labels, cascaded),
+    }
+
+
+def build(model_path: str = config.MODEL_PATH, output_path: str = None) -> dict:
+    """
+    Learns the cascade from all sample PDFs and saves it. Returns the
+    validation report: on the samples themselves (where the cascade must
+    not change any prediction) and held out (see cross_validate), which
+    estimates the recall lost on unseen documents.
+    """
+    from . import heading_classifier
+
+    output_path = output_path or config.HEADING_CASCADE_PATH
+    model = heading_classifier.HeadingClassifier(model_path, use_cascade=False)
+    documents = _labeled_samples()
+    spans, labels, blocks = _stack(documents)
+    cascade = Cascade(learn(_protected(model, spans, labels, blocks)), _model_digest(model_path))
+
+    rows, skipped, changed, _, _ = _evaluate(cascade, model, spans, labels, blocks)
+    report = {
+        "rows": rows,
+        "skipped": skipped,
+        "changed_predictions": changed,
+        "held_out": cross_validate(model, documents),
+    }
+    if report["changed_predictions"]:
+        raise RuntimeError(f"Cascade changes heading predictions on the samples: {report}")
+    held_out = report["held_out"]
+    if held_out["changed_predictions"] or held_out["recall"] != held_out["recall_with_cascade"]:
+        print(f"Warning: on held-out samples the cascade changed {held_out['changed_predictions']} "
+              f"prediction(s); recall {held_out['recall']} -> {held_out['recall_with_cascade']}")
+    cascade.save(output_path, report)
+    return report
+
+
+def validate(pdf_paths: list, model_path: str = config.MODEL_PATH, cascade_path: str = None) -> dict:
+    """
+    Applies a saved cascade to unlabeled PDFs and counts the skipped model
+    evaluations and any heading predictions it would have suppressed.
+    """
+    from . import heading_classifier
+
+    cascade = Cascade.load(cascade_path or config.HEADING_CASCADE_PATH)
+    model = heading_classifier.HeadingClassifier(model_path, use_cascade=False)
+    rows = skipped = lost = 0
+    for pdf_path in pdf_paths:
+        layout = document_layout.extract_layout(pdf_path)
+        matrix = np.concatenate([
+            layout.features(layout.non_empty_spans()),
+            layout.features(layout.block_starts()),
+        ])
+        mask = cascade.body_mask(matrix)
+        predictions = np.asarray(model.predict(matrix), dtype=object)
+        rows += len(matrix)
+        skipped += int(mask.sum())
+        lost += int(np.sum(mask & np.isin(predictions, heading_classifier.HEADING_LABELS)))
+    return {"rows": rows, "skipped": skipped, "suppressed_headings": lost}
+
+
+def _model_digest(model_path: str) -> str:
+    """
+    Digest of the joblib model, or (when only the export is deployed) the
+    digest the compiled forest was exported from.
+    """
+    from . import forest_engine
+
+    if os.path.exists(model_path):
+        return hashing.file_digest(model_path)
+    return forest_engine.read_source_digest(forest_engine.compiled_path(model_path))
+
+
+def load_for_model(model_path: str):
+    """
+    The saved cascade if it is enabled and was learned for this model, else None.
+    """
+    path = config.HEADING_CASCADE_PATH
+    if not config.HEADING_CASCADE_ENABLED or not os.path.exists(path):
+        return None
+    cascade = Cascade.load(path)
+    if cascade.model_digest != _model_digest(model_path):
+        print(f"Warning: {path} was learned for a different heading model; not using it")
+        return None
+    return cascade
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Learn or validate the rule cascade in front of the heading model.")
+    parser.add_argument('command', choices=['learn', 'validate'])
+    parser.add_argument('pdfs', nargs='*', help="PDFs to validate on (validate only)")
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'learn':
+        report = build(args.model)
+        print(f"Cascade saved to {config.HEADING_CASCADE_PATH}")
+    else:
+        report = validate(args.pdfs, args.model)
+    print(json.dumps(report, indent=4))
+    print(f"Skipped {report['skipped']} of {report['rows']} model evaluations "
+          f"({report['skipped'] / max(report['rows'], 1):.1%})")
@@ -21,4 +21,88 @@ TRAINING_DATA_PATH = os.path.join(BASE_DIR, 'training_data.csv')
 
 # Define the labels you're trying to predict
 # 'Body' will be our label for any text that is not a heading
-LABELS = ["H1", "H2", "H3", "Body"]
\ No newline at end of file
+LABELS = ["H1", "H2", "H3", "Body"]
+
+# On-disk cache of sentence embeddings, shared by all 1B runs
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, 'embeddings')
+# Maximum number of cached embeddings (least recently used are evicted); 0 disables
+EMBEDDING_CACHE_SIZE = 200000
+
+# Embedding backend: 'float32' or 'int8' (dynamically quantized, CPU)
+EMBEDDING_BACKEND = 'float32'
+# Torch CPU threads for embedding; None keeps the torch default
+EMBEDDING_THREADS = None
+# Padded tokens per length-bucketed batch; 0 uses fixed batches of 64 texts
+EMBEDDING_TOKENS_PER_BATCH = 8192
+
+# Cache of parsed span layouts, keyed by PDF content hash
+LAYOUT_CACHE_DIR = os.path.join(CACHE_DIR, 'layout')
+LAYOUT_CACHE_ENABLED = True
+# Least recently used layouts are evicted beyond this size (0 = unbounded)
+LAYOUT_CACHE_MAX_MB = 512
+
+# Large PDFs are split into page ranges of this size when running with --workers
+PAGES_PER_TASK = 100
+
+# Incremental mode: fingerprints of every output, and per-document 1B chunks
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+CHUNK_CACHE_DIR = os.path.join(CACHE_DIR, 'chunks')
+
+# Heading model evaluator: 'auto', 'compiled' (NumPy export) or 'sklearn'
+HEADING_BACKEND = 'auto'
+
+# Default location of the persistent vector index (see vector_index.py)
+VECTOR_INDEX_DIR = os.path.join(CACHE_DIR, 'vector_index')
+
+# Where --profile writes its JSON trace and Prometheus text by default
+PROFILE_DIR = os.path.join(CACHE_DIR, 'profiles')
+
+# Per-PDF feature and label shards used to train from (see feature_store.py)
+FEATURE_STORE_DIR = os.path.join(CACHE_DIR, 'features')
+# Cores used to fit the forest (-1 = all)
+TRAINING_JOBS = -1
+
+# OCR fallback for pages without a text layer (needs pytesseract, Pillow and tesseract)
+OCR_ENABLED = True
+OCR_LANGUAGE = 'eng'
+# Pixels on the longest side of a rendered page, clamped to [OCR_MIN_DPI, OCR_MAX_DPI]
+OCR_TARGET_SIDE_PX = 3300
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 400
+# Words recognized with a lower confidence (0-100) are dropped
+OCR_MIN_CONFIDENCE = 30
+# Seconds of OCR allowed per document, and its worker processes (0 = one per CPU)
+OCR_TIME_BUDGET = 60
+OCR_WORKERS = 0
+# OCR results, keyed by the hash of the rendered page image
+OCR_CACHE_DIR = os.path.join(CACHE_DIR, 'ocr')
+
+# Rule cascade that labels obvious body text before the heading model (see cascade.py)
+HEADING_CASCADE_ENABLED = True
+HEADING_CASCADE_PATH = os.path.join(MODELS_DIR, 'cascade.json')
+# Relative slack added to the learned thresholds; at 0.3 the held-out validation on
+# the samples (cascade.cross_validate) already loses H3 recall, at 0.4 nothing
+HEADING_CASCADE_MARGIN = 0.4
+
+# 1B lexical prefilter: embed only each query's N best chunks by BM25 (0 = embed every chunk)
+LEXICAL_CANDIDATES = 0
+
+# Cache of per-document analyses (title, outline and chunks) shared by both pipelines
+ANALYSIS_CACHE_DIR = os.path.join(CACHE_DIR, 'analysis')
+ANALYSIS_CACHE_ENABLED = True
+# Least recently used analyses are evicted beyond this size (0 = unbounded)
+ANALYSIS_CACHE_MAX_MB = 256
+
+# 1B chunk dedup (see dedup.py): page furniture lies in the top or bottom margin
+# (this share of the page height), has at least FURNITURE_MIN_WORDS words and recurs
+# at the same position on at least this many pages and this share of a document's pages
+DEDUP_ENABLED = True
+FURNITURE_MARGIN = 0.1
+FURNITURE_MIN_WORDS = 2
+FURNITURE_MIN_PAGES = 3
+FURNITURE_MIN_FRACTION = 0.5
+# Height in points of the vertical bands furniture positions are compared in
+FURNITURE_BAND_HEIGHT = 12
+# Estimated Jaccard similarity (word 3-grams) above which chunks are near duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
@@ -2,73 +2,92 @@
 
 import os
 import json
+import argparse
 import pandas as pd
-import fitz  # PyMuPDF
 
 from . import config
 from . import feature_extractor
+from . import feature_store
+from . import layout as document_layout
 
-def create_dataset():
+
+def load_heading_lookup(json_path: str) -> dict:
     """
-    Creates a labeled dataset from the sample PDFs and JSONs.
+    The ground-truth headings of a sample JSON as {(page_num, text): level}.
     """
-    all_rows = []
-    sample_files = [f for f in os.listdir(config.SAMPLES_DIR) if f.endswith('.pdf')]
+    # Load the ground truth headings from the JSON file
+    with open(json_path, 'r', encoding='utf-8') as f:
+        ground_truth = json.load(f)
 
-    for pdf_filename in sample_files:
-        json_filename = pdf_filename.replace('.pdf', '.json')
-        pdf_path = os.path.join(config.SAMPLES_DIR, pdf_filename)
-        json_path = os.path.join(config.SAMPLES_DIR, json_filename)
+    # Create a quick lookup for headings: {(page_num, text): "H1"}
+    heading_lookup = {}
+    for heading in ground_truth.get("outline") or []:
+        # Normalize text for better matching
+        clean_text = heading['text'].strip()
+        heading_lookup[(heading['page'], clean_text)] = heading['level']
+    return heading_lookup
 
-        if not os.path.exists(json_path):
+
+def label_spans(heading_lookup: dict, pages, texts) -> list:
+    """
+    The label of every span: its heading level, or "Body".
+    """
+    return [
+        heading_lookup.get((int(page_num), str(text).strip()), "Body")
+        for page_num, text in zip(pages, texts)
+    ]
+
+
+def labeled_sample_pdfs(samples_dir: str = None) -> list:
+    """
+    (pdf_path, json_path) of every sample PDF that has a ground-truth JSON.
+    """
+    samples_dir = samples_dir or config.SAMPLES_DIR
+    pairs = []
+    for pdf_filename in sorted(os.listdir(samples_dir)):
+        if not pdf_filename.endswith('.pdf'):
             continue
+        json_path = os.path.join(samples_dir, pdf_filename.replace('.pdf', '.json'))
+        if os.path.exists(json_path):
+            pairs.append((os.path.join(samples_dir, pdf_filename), json_path))
+    return pairs
 
-        # Load the ground truth headings from the JSON file
-        with open(json_path, 'r', encoding='utf-8') as f:
-            ground_truth = json.load(f)
-        
-        # Create a quick lookup for headings: {(page_num, text): "H1"}
-        heading_lookup = {}
-        if ground_truth.get("outline"):
-            for heading in ground_truth["outline"]:
-                # Normalize text for better matching
-                clean_text = heading['text'].strip()
-                heading_lookup[(heading['page'], clean_text)] = heading['level']
-
-        # Process the PDF
-        doc = fitz.open(pdf_path)
-        for page_num, page in enumerate(doc):
-            blocks = page.get_text("dict")["blocks"]
-            page_rect = page.rect
-            
-            # Calculate average font size for normalization
-            font_sizes = [span['size'] for block in blocks if 'lines' in block for line in block['lines'] for span in line['spans']]
-            avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-
-            for block in blocks:
-                if 'lines' not in block:
-                    continue
-                for line in block['lines']:
-                    for span in line['spans']:
-                        text = span['text'].strip()
-                        if not text:
-                            continue
-
-                        # Extract features
-                        features = feature_extractor.extract_features(
-                            span, page_rect.width, page_rect.height, avg_font_size
-                        )
-
-                        # Label the data
-                        label = heading_lookup.get((page_num, text), "Body")
-                        features['label'] = label
-                        all_rows.append(features)
-        doc.close()
+
+def create_dataset():
+    """
+    Creates a labeled dataset from the sample PDFs and JSONs.
+    """
+    all_frames = []
+    for pdf_path, json_path in labeled_sample_pdfs():
+        heading_lookup = load_heading_lookup(json_path)
+
+        # Process the PDF (the parsed layout is shared with the other pipelines)
+        layout = document_layout.extract_layout(pdf_path)
+        span_indices = layout.non_empty_spans()
+        features = pd.DataFrame(layout.features(span_indices), columns=feature_extractor.FEATURE_NAMES)
+        features = features.astype(feature_extractor.FEATURE_DTYPES)
+
+        # Label the data
+        features['label'] = label_spans(heading_lookup, layout.page[span_indices], layout.texts(span_indices))
+        all_frames.append(features)
 
     # Create and save the DataFrame
-    df = pd.DataFrame(all_rows)
+    if all_frames:
+        df = pd.concat(all_frames, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=feature_extractor.FEATURE_NAMES + ['label'])
     df.to_csv(config.TRAINING_DATA_PATH, index=False)
     print(f"Training data created and saved to {config.TRAINING_DATA_PATH}")
 
 if __name__ == '__main__':
-    create_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the heading training data from the sample PDFs.")
+    parser.add_argument('--shards', action='store_true',
+                        help="update the per-PDF feature store instead of writing one CSV")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes used to extract features with --shards (0 = one per CPU)")
+    args = parser.parse_args()
+
+    if args.shards:
+        feature_store.build_store(workers=args.workers)
+    else:
+        create_dataset()
@@ -0,0 +1,150 @@
+# src/dedup.py
+
+import hashlib
+import re
+import zlib
+import numpy as np
+
+from . import config
+
+_NON_WORD = re.compile(r"[^\w]+")
+_DIGITS = re.compile(r"\d+")
+
+# MinHash signature: BANDS x ROWS_PER_BAND hashes, bucketed per band (LSH)
+BANDS = 16
+ROWS_PER_BAND = 4
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)  # Fixed, so results are the same in every run
+_A = _rng.integers(1, _PRIME, BANDS * ROWS_PER_BAND, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, BANDS * ROWS_PER_BAND, dtype=np.uint64)
+
+
+def normalize(text: str) -> str:
+    """
+    Case, punctuation and whitespace-insensitive form of a text.
+    """
+    return " ".join(_NON_WORD.sub(" ", text.casefold()).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize(text).encode('utf-8')).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """
+    Word `size`-grams of the normalized text, hashed to 32-bit integers.
+    """
+    words = normalize(text).split()
+    if len(words) < size:
+        return set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set: set) -> np.ndarray:
+    """
+    MinHash signature of a shingle set under fixed universal hash functions.
+    """
+    values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set)) % np.uint64(_PRIME)
+    # (a * x + b) mod p with a, b, x < 2^31, so nothing overflows uint64
+    return ((_A * values[:, None] + _B) % np.uint64(_PRIME)).min(axis=0)
+
+
+def _location(chunk: dict) -> dict:
+    # Named like the Challenge 1B output fields
+    return {"document": chunk['source_pdf'], "page_number": chunk['page_number']}
+
+
+def furniture_keys(chunks: list) -> set:
+    """
+    Page furniture (running headers, footers, disclaimers): per document,
+    the (normalized text with digits masked, vertical position band) pairs
+    of margin chunks (see _furniture_key) that recur on at least
+    config.FURNITURE_MIN_PAGES pages and config.FURNITURE_MIN_FRACTION of
+    the pages that have chunks.
+    """
+    pages_by_key, pages_by_document = {}, {}
+    for chunk in chunks:
+        pages_by_document.setdefault(chunk['source_pdf'], set()).add(chunk['page_number'])
+        key = _furniture_key(chunk)
+        if key is not None:
+            pages_by_key.setdefault(key, set()).add(chunk['page_number'])
+    return {
+        key for key, pages in pages_by_key.items()
+        if len(pages) >= max(config.FURNITURE_MIN_PAGES,
+                             config.FURNITURE_MIN_FRACTION * len(pages_by_document[key[0]]))
+    }
+
+
+def _furniture_key(chunk: dict):
+    """
+    (document, text, band) for a chunk that could be furniture: it lies
+    entirely in the top or bottom config.FURNITURE_MARGIN of its page and
+    has at least config.FURNITURE_MIN_WORDS words, so section titles that
+    merely repeat from page to page are not taken for running headers.
+    Else None.
+    """
+    bbox, page_height = chunk.get('bbox'), chunk.get('page_height')
+    if bbox is None or not page_height:
+        return None
+    margin = config.FURNITURE_MARGIN * page_height
+    if bbox[3] > margin and bbox[1] < page_height - margin:
+        return None
+    # Page numbers and dates change from page to page
+    text = _DIGITS.sub("#", normalize(chunk['content']))
+    if len(text.split()) < config.FURNITURE_MIN_WORDS:
+        return None
+    return chunk['source_pdf'], text, int(bbox[1] // config.FURNITURE_BAND_HEIGHT)
+
+
+def dedup_chunks(chunks: list) -> tuple:
+    """
+    Removes page furniture and collapses duplicate chunks, keeping the first
+    occurrence of each text (in chunk order).
+
+    Exact duplicates are found by the hash of the normalized text, near
+    duplicates by MinHash over word 3-grams with LSH banding; a chunk is a
+    near duplicate of a kept one when their estimated Jaccard similarity is
+    at least config.NEAR_DUPLICATE_THRESHOLD. Every kept chunk gets a
+    'locations' list with the document and page of each copy, which
+    main_1b includes in its output.
+
+    Returns (kept chunks, {"furniture", "exact", "near"} removal counts).
+    """
+    furniture = furniture_keys(chunks)
+    kept, stats = [], {"furniture": 0, "exact": 0, "near": 0}
+    by_hash, buckets, signatures = {}, {}, []
+
+    for chunk in chunks:
+        if furniture and _furniture_key(chunk) in furniture:
+            stats["furniture"] += 1
+            continue
+
+        digest = text_hash(chunk['content'])
+        original = by_hash.get(digest)
+        if original is not None:
+            kept[original]['locations'].append(_location(chunk))
+            stats["exact"] += 1
+            continue
+
+        shingle_set = shingles(chunk['content'])
+        signature = minhash(shingle_set) if shingle_set else None
+        if signature is not None:
+            bands = [(band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+                     for band in range(BANDS)]
+            candidates = sorted({index for key in bands for index in buckets.get(key, ())})
+            match = next((
+                index for index in candidates
+                if np.mean(signatures[index] == signature) >= config.NEAR_DUPLICATE_THRESHOLD
+            ), None)
+            if match is not None:
+                kept[match]['locations'].append(_location(chunk))
+                stats["near"] += 1
+                continue
+
+        by_hash[digest] = len(kept)
+        if signature is not None:
+            for key in bands:
+                buckets.setdefault(key, []).append(len(kept))
+        signatures.append(signature)
+        kept.append(dict(chunk, locations=[_location(chunk)]))
+    return kept, stats
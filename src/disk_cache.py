@@ -0,0 +1,63 @@
+# src/disk_cache.py
+
+import os
+import tempfile
+
+
+def write_atomic(path: str, write, binary: bool = False):
+    """
+    Calls write(f) on a temp file unique to this writer (threads share a
+    pid, so the pid is not enough) next to `path`, then moves it into place.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        if binary:
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', encoding='utf-8')
+        with f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def touch(path: str):
+    """
+    Marks a cache file as recently used, so prune keeps it.
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune(directory: str, max_mb: float):
+    """
+    Deletes the least recently used files of a cache directory until it
+    holds at most `max_mb` megabytes (0 or less = unbounded). Temp files of
+    writers still in progress are left alone.
+    """
+    if max_mb <= 0:
+        return
+    entries, total = [], 0
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except OSError:
+        return
+    limit = max_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # Already removed by another process
+        total -= size
@@ -0,0 +1,174 @@
+# src/document_engine.py
+
+import hashlib
+import json
+import os
+import numpy as np
+
+from . import config
+from . import disk_cache
+from . import hashing
+from . import heading_classifier
+from . import instrumentation
+from . import layout as document_layout
+
+# Bump when the stored analysis changes so stale cache files are ignored
+ANALYSIS_VERSION = 4
+
+
+def extract_title(layout) -> str:
+    """
+    A simple rule: the title is the largest text on the first page.
+    This can be made more sophisticated.
+    """
+    if layout.first_page != 0 or layout.n_pages == 0:
+        return ""
+    page1_spans = layout.page_span_range(0)
+    if len(page1_spans) == 0:
+        return ""
+    largest = page1_spans[int(np.argmax(layout.size[page1_spans.start:page1_spans.stop]))]
+    return layout.text(largest).strip() if layout.size[largest] > 0 else ""
+
+
+def outline_entries(layout, span_indices, predictions) -> list:
+    """
+    The 1A outline: every span predicted as a heading.
+    """
+    outline = []
+    for span_index, prediction in zip(span_indices, predictions):
+        if heading_classifier.is_heading(prediction):
+            outline.append({
+                "level": prediction,
+                "text": layout.text(span_index).strip(),
+                "page": int(layout.page[span_index]) + 1 # Page numbers are 1-indexed in output
+            })
+    return outline
+
+
+def block_units(layout) -> tuple:
+    """
+    The text of every non-empty block, the index of its first span (whose
+    features represent the block) and the block's bounding box.
+    """
+    block_texts, first_spans, bboxes = [], [], []
+    starts = layout.block_starts()
+    stops = np.append(starts[1:], layout.n_spans)
+    with instrumentation.stage("join_blocks"):
+        for start, stop in zip(starts, stops):
+            # Combine all spans in a block
+            block_text = " ".join(layout.texts(range(start, stop))).strip()
+            if not block_text:
+                continue
+            block_texts.append(block_text.replace('\n', ' '))
+            first_spans.append(start)
+            spans = layout.bbox[start:stop]
+            bboxes.append([
+                round(float(spans[:, 0].min()), 1), round(float(spans[:, 1].min()), 1),
+                round(float(spans[:, 2].max()), 1), round(float(spans[:, 3].max()), 1),
+            ])
+    return block_texts, np.array(first_spans, dtype=np.int64), bboxes
+
+
+def build_chunks(layout, pdf_path: str, block_texts: list, first_spans, bboxes: list, predictions) -> tuple:
+    """
+    The 1B chunks: body blocks attached to the heading block before them.
+    Each chunk keeps its block's bbox and page height (page furniture
+    detection, see dedup.py).
+
+    Returns (chunks, last_heading); chunks before the first heading have
+    parent_heading None (see document_parser.parse_page_range).
+    """
+    chunks = []
+    current_heading = None
+    for block_text, page_num, bbox, prediction in zip(block_texts, layout.page[first_spans], bboxes, predictions):
+        if heading_classifier.is_heading(prediction):
+            # The model says this block is a heading
+            current_heading = block_text
+        else:
+            # The model says this block is 'Body' text
+            chunks.append({
+                "content": block_text,
+                "source_pdf": os.path.basename(pdf_path),
+                "page_number": int(page_num) + 1,
+                "parent_heading": current_heading,
+                "bbox": bbox,
+                "page_height": float(layout.page_height[page_num - layout.first_page]),
+            })
+    instrumentation.count("chunks", len(chunks))
+    return chunks, current_heading
+
+
+def analyze_layout(layout, pdf_path: str, classifier) -> dict:
+    """
+    Builds the title, outline and chunks of a parsed layout with a single
+    predict call over every row either output needs: the non-empty spans
+    (outline) and the first span of every block (chunks).
+    """
+    span_indices = layout.non_empty_spans()
+    block_texts, first_spans, bboxes = block_units(layout)
+    rows = np.union1d(span_indices, first_spans)
+
+    with instrumentation.stage("features"):
+        features = layout.features(rows)
+    with instrumentation.stage("predict"):
+        predictions = np.asarray(classifier.predict(features), dtype=object)
+    instrumentation.count("predictions", len(predictions))
+
+    chunks, last_heading = build_chunks(
+        layout, pdf_path, block_texts, first_spans, bboxes, predictions[np.searchsorted(rows, first_spans)]
+    )
+    return {
+        "title": extract_title(layout),
+        "outline": outline_entries(layout, span_indices, predictions[np.searchsorted(rows, span_indices)]),
+        "chunks": chunks,
+        "last_heading": last_heading,
+        "complete": bool(layout.ocr_complete),
+    }
+
+
+def _cache_path(pdf_path: str, pages, classifier) -> str:
+    key = hashlib.sha256("|".join([
+        hashing.file_digest(pdf_path),
+        str(pages),
+        classifier.fingerprint,
+        hashing.code_digest(),
+    ]).encode('utf-8')).hexdigest()
+    return os.path.join(config.ANALYSIS_CACHE_DIR, f"{key}-v{ANALYSIS_VERSION}.json")
+
+
+def analyze(pdf_path: str, pages: tuple = None, classifier=None, use_cache: bool = None) -> dict:
+    """
+    Opens, parses and classifies a PDF (or the page range `pages`) once and
+    returns everything both pipelines need:
+
+        {"title", "outline", "chunks", "last_heading", "complete"}
+
+    The analysis is cached on disk by PDF, page range, model and code, so
+    building outlines (main.py) and chunks (document_parser.py) for the
+    same corpus costs one parse and one classification. The cache is kept
+    under config.ANALYSIS_CACHE_MAX_MB by evicting the least recently used
+    analyses. Analyses of
+    layouts with pages OCR didn't finish ("complete" False) are not cached.
+    """
+    classifier = classifier or heading_classifier.get_classifier(config.MODEL_PATH)
+    if use_cache is None:
+        use_cache = config.ANALYSIS_CACHE_ENABLED
+    cache_path = _cache_path(pdf_path, pages, classifier) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                analysis = json.load(f)
+            instrumentation.count("analysis_cache_hits")
+            disk_cache.touch(cache_path)
+            return analysis
+        except (OSError, ValueError):
+            pass  # Corrupt or partial cache file; analyze again
+
+    layout = document_layout.extract_layout(pdf_path, pages)
+    analysis = analyze_layout(layout, pdf_path, classifier)
+
+    if cache_path and analysis["complete"]:
+        os.makedirs(config.ANALYSIS_CACHE_DIR, exist_ok=True)
+        disk_cache.write_atomic(cache_path, lambda f: json.dump(analysis, f))
+        disk_cache.prune(config.ANALYSIS_CACHE_DIR, config.ANALYSIS_CACHE_MAX_MB)
+    return analysis
@@ -1,21 +1,86 @@
 # src/document_parser.py
-import fitz  # PyMuPDF
+import hashlib
+import itertools
+import json
 import os
-import joblib  # To load your 1A model
-import pandas as pd # To format data for the model
 
-# IMPORTANT: Assuming your 1A feature extractor is in a file
-# called 'feature_extractor.py' inside the 'src' folder.
-from . import feature_extractor 
+from . import config
+from . import disk_cache
+from . import document_engine
+from . import hashing
+# The batched 1A heading classifier (see heading_classifier.py)
+from . import heading_classifier
+from . import instrumentation
+from . import layout as document_layout
+from . import parallel
 
-# Load the trained model from Round 1A once when the module is imported
+# The trained model from Round 1A, loaded once per process on first use
 MODEL_PATH = 'models/heading_classifier.joblib'
-if os.path.exists(MODEL_PATH):
-    HEADING_MODEL = joblib.load(MODEL_PATH)
-    FEATURE_NAMES = HEADING_MODEL.feature_names_in_
-else:
-    HEADING_MODEL = None
-    print(f"Warning: Heading model not found at {MODEL_PATH}")
+_warned_missing_model = False
+
+
+def get_heading_model():
+    """
+    Returns the heading classifier, or None if the model has not been trained.
+    """
+    global _warned_missing_model
+    if not os.path.exists(MODEL_PATH):
+        if not _warned_missing_model:
+            print(f"Warning: Heading model not found at {MODEL_PATH}")
+            _warned_missing_model = True
+        return None
+    return heading_classifier.get_classifier(MODEL_PATH)
+
+
+def parse_page_range(pdf_path: str, pages: tuple = None) -> tuple:
+    """
+    Chunks the blocks of one page range of a PDF.
+
+    Returns (chunks, last_heading). Chunks that appear before the first
+    heading of the range have parent_heading None, since their heading (if
+    any) lies in an earlier range; last_heading is None if the range has no
+    heading at all. merge_page_ranges stitches the ranges back together.
+
+    The range is analyzed by document_engine, so the outline pipeline
+    reuses the same parse and classification.
+    """
+    analysis = document_engine.analyze(pdf_path, pages, get_heading_model())
+    return analysis["chunks"], analysis["last_heading"]
+
+
+def chunk_layout(layout, pdf_path: str) -> tuple:
+    """
+    Chunks the blocks of a parsed layout; see parse_page_range.
+    """
+    # Treat each text block as one unit, represented by the features of its first span
+    block_texts, first_spans, bboxes = document_engine.block_units(layout)
+
+    # Classify every block of the range with one batched model call
+    with instrumentation.stage("features"):
+        features = layout.features(first_spans)
+    with instrumentation.stage("predict"):
+        predictions = get_heading_model().predict(features)
+    instrumentation.count("predictions", len(predictions))
+
+    # Use the predictions to attach body text to its heading
+    return document_engine.build_chunks(layout, pdf_path, block_texts, first_spans, bboxes, predictions)
+
+
+def merge_page_ranges(results: list) -> list:
+    """
+    Concatenates parse_page_range results (in page order), carrying the last
+    heading of each range into the leading chunks of the next.
+    """
+    chunks = []
+    current_heading = "Introduction"  # Default heading
+    for range_chunks, last_heading in results:
+        for chunk in range_chunks:
+            if chunk['parent_heading'] is None:
+                chunk['parent_heading'] = current_heading
+            chunks.append(chunk)
+        if last_heading is not None:
+            current_heading = last_heading
+    return chunks
 
 
 def parse_pdf_to_chunks(pdf_path: str) -> list:
@@ -23,55 +88,112 @@ def parse_pdf_to_chunks(pdf_path: str) -> list:
     Parses a PDF using the trained 1A model to identify headings and
     then associates text paragraphs with those headings.
     """
-    if not os.path.exists(pdf_path) or not HEADING_MODEL:
+    if not os.path.exists(pdf_path) or get_heading_model() is None:
         return []
+    with instrumentation.document(pdf_path):
+        return merge_page_ranges([parse_page_range(pdf_path)])
 
-    doc = fitz.open(pdf_path)
-    chunks = []
+
+def iter_chunks(pdf_path: str):
+    """
+    Yields the chunks of a PDF (the same ones parse_pdf_to_chunks returns)
+    page by page, so only one page is held in memory at a time.
+    """
+    if not os.path.exists(pdf_path) or get_heading_model() is None:
+        return
     current_heading = "Introduction"  # Default heading
+    with instrumentation.document(pdf_path):
+        for layout in document_layout.iter_pages(pdf_path):
+            chunks, last_heading = chunk_layout(layout, pdf_path)
+            for chunk in chunks:
+                if chunk['parent_heading'] is None:
+                    chunk['parent_heading'] = current_heading
+                yield chunk
+            if last_heading is not None:
+                current_heading = last_heading
+
+
+def _chunk_task(task):
+    """
+    Worker entry point for parse_pdfs_to_chunks: a parse_page_range result
+    and whether the range was fully read (see document_engine.analyze).
+    """
+    pdf_path, pages = task
+    with instrumentation.document(pdf_path):
+        analysis = document_engine.analyze(pdf_path, pages, get_heading_model())
+    return (analysis["chunks"], analysis["last_heading"]), analysis["complete"]
+
+
+def _chunk_cache_path(pdf_path: str) -> str:
+    """
+    Cache file for the chunks of one PDF, keyed by the PDF, the heading
+    classifier (model and cascade) and the code.
+    """
+    key = hashlib.sha256("|".join([
+        hashing.file_digest(pdf_path),
+        get_heading_model().fingerprint,
+        hashing.code_digest(),
+    ]).encode('utf-8')).hexdigest()
+    return os.path.join(config.CHUNK_CACHE_DIR, f"{key}.json")
+
+
+def _load_cached_chunks(cache_path: str):
+    """
+    The cached chunks at `cache_path`, or None if missing or unreadable.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_pdfs_to_chunks(pdf_paths: list, pool=None, use_cache: bool = False) -> list:
+    """
+    Parses several PDFs, optionally splitting them into page ranges processed
+    by a worker pool (see parallel.create_pool). Returns the chunks of all
+    documents in the order of `pdf_paths`.
+
+    With `use_cache`, the chunks of each PDF are stored on disk and reused
+    as long as the PDF, the heading model and the code are unchanged.
+    """
+    if get_heading_model() is None:
+        return []
+    pdf_paths = [pdf_path for pdf_path in pdf_paths if os.path.exists(pdf_path)]
+
+    doc_chunks = {}
+    if use_cache:
+        for doc_index, pdf_path in enumerate(pdf_paths):
+            cached = _load_cached_chunks(_chunk_cache_path(pdf_path))
+            if cached is not None:
+                doc_chunks[doc_index] = cached
+                with instrumentation.document(pdf_path):
+                    instrumentation.count("chunk_cache_hits")
+
+    tasks, task_docs = [], []
+    for doc_index, pdf_path in enumerate(pdf_paths):
+        if doc_index in doc_chunks:
+            continue
+        ranges = parallel.page_ranges(pdf_path) if pool is not None else [None]
+        for pages in ranges:
+            tasks.append((pdf_path, pages))
+            task_docs.append(doc_index)
+
+    results = parallel.map_tasks(pool, _chunk_task, tasks)
+
+    # Tasks are grouped by document, so consecutive results belong together
+    for doc_index, group in itertools.groupby(zip(task_docs, results), key=lambda item: item[0]):
+        group = [result for _, result in group]
+        chunks = merge_page_ranges([chunk_result for chunk_result, _ in group])
+        doc_chunks[doc_index] = chunks
+        # Don't freeze pages OCR didn't finish into the cache
+        if use_cache and all(complete for _, complete in group):
+            os.makedirs(config.CHUNK_CACHE_DIR, exist_ok=True)
+            disk_cache.write_atomic(_chunk_cache_path(pdf_paths[doc_index]), lambda f: json.dump(chunks, f))
 
-    for page_num, page in enumerate(doc):
-        # Calculate average font size on the page for feature normalization
-        font_sizes = [span['size'] for block in page.get_text("dict")["blocks"] if 'lines' in block for line in block['lines'] for span in line['spans']]
-        avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-
-        # We process text block by block
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if 'lines' not in block:
-                continue
-            
-            # Combine all spans in a block to treat it as one unit
-            block_text = " ".join([span['text'] for line in block['lines'] for span in line['spans']]).strip()
-            if not block_text:
-                continue
-
-            # --- REPLACEMENT LOGIC STARTS HERE ---
-            
-            # 1. Extract features for the block using your 1A feature extractor
-            # We'll use the features of the first span to represent the block
-            first_span = block['lines'][0]['spans'][0]
-            features = feature_extractor.extract_features(first_span, page.rect.width, page.rect.height, avg_font_size)
-            
-            # 2. Predict using your trained 1A model
-            features_df = pd.DataFrame([features])[FEATURE_NAMES] # Ensure column order is correct
-            prediction = HEADING_MODEL.predict(features_df)[0]
-            
-            # 3. Use the prediction to guide the logic
-            if prediction in ["H1", "H2", "H3"]:
-                # The model says this block is a heading
-                current_heading = block_text.replace('\n', ' ')
-            else:
-                # The model says this block is 'Body' text
-                chunk = {
-                    "content": block_text.replace('\n', ' '),
-                    "source_pdf": os.path.basename(pdf_path),
-                    "page_number": page_num + 1,
-                    "parent_heading": current_heading
-                }
-                chunks.append(chunk)
-
-            # --- REPLACEMENT LOGIC ENDS HERE ---
-                
-    doc.close()
-    return chunks
\ No newline at end of file
+    all_chunks = []
+    for doc_index in range(len(pdf_paths)):
+        all_chunks.extend(doc_chunks[doc_index])
+    return all_chunks
@@ -0,0 +1,263 @@
+# src/embedding_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from . import disk_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are kept apart
+    fcntl = None
+
+INDEX_FILENAME = 'index.json'
+VECTORS_FILENAME = 'vectors.f32'
+LOCK_FILENAME = 'lock'
+
+# Files larger than this are fingerprinted by size and mtime instead of content
+_FINGERPRINT_CONTENT_LIMIT = 1 << 20
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses runs of whitespace. The tokenizer ignores whitespace differences,
+    so texts that only differ in spacing share one cache entry.
+    """
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> str:
+    """
+    Content address of a (normalized) text.
+    """
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def model_fingerprint(model_path: str, extra: str = "") -> str:
+    """
+    Identifies a local sentence-transformer model directory.
+
+    Small files (configs, tokenizer, vocab) are hashed by content; large weight
+    files by size and modification time.
+    """
+    digest = hashlib.sha1(extra.encode('utf-8'))
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(os.path.relpath(path, model_path).encode('utf-8'))
+            if stat.st_size <= _FINGERPRINT_CONTENT_LIMIT:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+            else:
+                digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed store of embeddings for one model.
+
+    Vectors live in a flat float32 file that is memory-mapped as an
+    (allocated_slots, dim) array; index.json maps text keys to slots in
+    least- to most-recently-used order. When `max_entries` is reached the
+    least recently used entry is evicted and its slot reused.
+
+    The directory may be shared by several processes (worker pools, the
+    server next to CLI runs). Every operation first reloads index.json if
+    another process replaced it; lookups hold a shared file lock, and
+    insertions hold an exclusive one while they allocate slots, write the
+    vectors and write the index, so no slot is handed out twice and a
+    crash never leaves vectors without an index entry. Only recency
+    updates from lookups wait for flush().
+    """
+
+    def __init__(self, cache_dir: str, model_id: str, dim: int, max_entries: int):
+        self.directory = os.path.join(cache_dir, model_id[:16])
+        self.model_id = model_id
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> slot, LRU first
+        self._free = []
+        self._vectors = None
+        self._allocated = 0
+        self._dirty = False
+        self._touched = OrderedDict()  # Keys looked up since the index was last written
+        self._index_stamp = None  # Identifies the index.json the in-memory state was loaded from
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked(exclusive=False):
+            self._refresh()
+
+    # --- Persistence ---
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, VECTORS_FILENAME)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """
+        Serializes access among this process's threads and, through a
+        flock on the directory's lock file, among processes.
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, LOCK_FILENAME), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            return None
+        # The index is replaced, never rewritten in place, so its inode changes with every write
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """
+        Reloads the index if it changed since this process last read or
+        wrote it. Call with the file lock held.
+        """
+        stamp = self._stamp()
+        if stamp == self._index_stamp:
+            return
+        self._index_stamp = stamp
+        entries, allocated = [], 0
+        if stamp is not None and os.path.exists(self._vectors_path):
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            # A stale or foreign cache is ignored; it will be overwritten
+            if index.get('model_id') == self.model_id and index.get('dim') == self.dim:
+                entries, allocated = index['entries'], index['allocated']
+
+        if allocated != self._allocated or (allocated and self._vectors is None):
+            self._allocated = allocated
+            if allocated:
+                self._map(allocated)
+            else:
+                self._vectors = None
+        self._slots = OrderedDict((key, slot) for key, slot in entries)
+        # Keep this process's lookups that are not written yet most recent
+        for key in self._touched:
+            if key in self._slots:
+                self._slots.move_to_end(key)
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(self._allocated) if slot not in used]
+        # Honour a smaller cap than the one the cache was written with
+        while len(self._slots) > self.max_entries:
+            _, slot = self._slots.popitem(last=False)
+            self._free.append(slot)
+            self._dirty = True
+
+    def _map(self, slots: int):
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(slots, self.dim))
+
+    def _grow(self):
+        new_allocated = min(self.max_entries, max(1024, self._allocated * 2))
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(new_allocated * self.dim * 4)
+        self._free.extend(range(new_allocated - 1, self._allocated - 1, -1))
+        self._allocated = new_allocated
+        self._map(new_allocated)
+
+    def _write_index(self):
+        """
+        Writes the vectors and then the index. Call with the exclusive file lock held.
+        """
+        if self._vectors is not None:
+            self._vectors.flush()
+        index = {
+            'model_id': self.model_id,
+            'dim': self.dim,
+            'allocated': self._allocated,
+            'entries': list(self._slots.items()),
+        }
+        disk_cache.write_atomic(self._index_path, lambda f: json.dump(index, f))
+        self._index_stamp = self._stamp()
+        self._touched.clear()
+        self._dirty = False
+
+    def flush(self):
+        """
+        Writes the recency order changed by lookups to disk.
+        """
+        with self._locked(exclusive=True):
+            if not self._dirty:
+                return
+            self._refresh()
+            self._write_index()
+
+    # --- Lookup and insertion ---
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Returns {position: vector} for every key that is cached, counting hits
+        and misses.
+        """
+        found = {}
+        with self._locked(exclusive=False):
+            self._refresh()
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    self.misses += 1
+                    continue
+                self._slots.move_to_end(key)
+                self._touched[key] = None
+                self._touched.move_to_end(key)
+                found[i] = np.array(self._vectors[slot])
+                self.hits += 1
+            if found:
+                self._dirty = True  # Recency order changed
+        return found
+
+    def put_many(self, keys: list, vectors: np.ndarray):
+        """
+        Stores vectors under their keys, evicting least recently used entries
+        when the cache is full, and writes the index.
+        """
+        with self._locked(exclusive=True):
+            self._refresh()
+            for key, vector in zip(keys, vectors):
+                slot = self._slots.get(key)
+                if slot is None:
+                    if not self._free:
+                        if self._allocated < self.max_entries:
+                            self._grow()
+                        else:
+                            _, evicted = self._slots.popitem(last=False)
+                            self._free.append(evicted)
+                    slot = self._free.pop()
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self._vectors[slot] = vector
+            self._write_index()
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._slots)}
+
+    def __len__(self):
+        return len(self._slots)
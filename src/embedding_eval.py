@@ -0,0 +1,76 @@
+# src/embedding_eval.py
+
+import argparse
+import json
+import os
+import time
+
+from . import config
+from . import document_parser
+from . import main_1b
+from . import ranking
+from . import semantic_analyzer
+
+COLLECTIONS_DIR = os.path.join(config.BASE_DIR, 'Challenge_1b')
+
+# Configurations compared against the float32, fixed-batch reference
+VARIANTS = {
+    'float32': dict(backend='float32', tokens_per_batch=0),
+    'float32-bucketed': dict(backend='float32', tokens_per_batch=semantic_analyzer.DEFAULT_TOKENS_PER_BATCH),
+    'int8-bucketed': dict(backend='int8', tokens_per_batch=semantic_analyzer.DEFAULT_TOKENS_PER_BATCH),
+}
+
+
+def load_collections() -> list:
+    """
+    (name, query texts, chunk texts) for every bundled Challenge 1B collection.
+    """
+    collections = []
+    for folder_name in sorted(os.listdir(COLLECTIONS_DIR)):
+        input_path = os.path.join(COLLECTIONS_DIR, folder_name, 'challenge1b_input.json')
+        if not os.path.exists(input_path):
+            continue
+        with open(input_path, 'r') as f:
+            input_data = json.load(f)
+        pdf_folder = os.path.join(COLLECTIONS_DIR, folder_name, 'PDFs')
+        pdf_paths = [os.path.join(pdf_folder, doc['filename']) for doc in input_data['documents']]
+        chunks = document_parser.parse_pdfs_to_chunks(pdf_paths)
+        queries = [f"{persona}: {job}" for persona, job in main_1b.collection_queries(input_data)]
+        collections.append((folder_name, queries, [chunk['content'] for chunk in chunks]))
+    return collections
+
+
+def evaluate(threads: int = None, k: int = 10):
+    """
+    Compares each embedding variant with the float32 reference: top-k overlap
+    of the chunk ranking per collection, and encoding throughput.
+    """
+    collections = load_collections()
+    rankings = {}
+    print(f"{'variant':>18} {'collection':>14} {'top-' + str(k) + ' agree':>12} {'chunks/s':>10}")
+    for name, options in VARIANTS.items():
+        # No cache, so every variant really runs the model
+        analyzer = semantic_analyzer.SemanticAnalyzer(main_1b.EMBEDDING_MODEL_PATH, threads=threads, **options)
+        for collection, queries, texts in collections:
+            start = time.perf_counter()
+            chunk_embeddings = analyzer.encode(texts)
+            elapsed = time.perf_counter() - start
+            query_embeddings = analyzer.encode(queries)
+            scores = chunk_embeddings @ query_embeddings.T
+            rankings[name, collection] = [set(ranking.top_k(scores[:, q], k).tolist()) for q in range(len(queries))]
+
+            reference = rankings['float32', collection]
+            # Collections with fewer than k chunks rank all of them
+            compared = sum(len(theirs) for theirs in reference)
+            agreement = sum(
+                len(ours & theirs) for ours, theirs in zip(rankings[name, collection], reference)
+            ) / compared if compared else 1.0
+            print(f"{name:>18} {collection:>14} {agreement:>12.0%} {len(texts) / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check ranking quality and throughput of the embedding backends.")
+    parser.add_argument('--threads', type=int, help="torch CPU threads")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    evaluate(args.threads, args.k)
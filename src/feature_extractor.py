@@ -2,6 +2,36 @@
 
 import re
 
+import numpy as np
+
+# Column order of the feature matrix; matches the key order of extract_features
+FEATURE_NAMES = [
+    'text_length',
+    'starts_with_number',
+    'is_all_caps',
+    'font_size',
+    'size_ratio',
+    'is_bold',
+    'x_position_ratio',
+    'y_position_ratio',
+    'center_distance_ratio',
+]
+
+# Natural dtype of each feature, as produced by extract_features
+FEATURE_DTYPES = {
+    'text_length': 'int64',
+    'starts_with_number': 'int64',
+    'is_all_caps': 'int64',
+    'font_size': 'float64',
+    'size_ratio': 'float64',
+    'is_bold': 'int64',
+    'x_position_ratio': 'float64',
+    'y_position_ratio': 'float64',
+    'center_distance_ratio': 'float64',
+}
+
+_NUMBER_PREFIX = re.compile(r'^\d+(\.\d+)*')
+
 def extract_features(span, page_width, page_height, avg_font_size):
     """
     Extracts features from a single text span (a block of text from PyMuPDF).
@@ -40,4 +70,73 @@ def extract_features(span, page_width, page_height, avg_font_size):
     # Calculate how far from the center it is, as a percentage of page width
     features['center_distance_ratio'] = abs(span_center - page_center) / page_width if page_width > 0 else 0
 
-    return features
\ No newline at end of file
+    return features
+
+
+def _safe_divide(numerator, denominator, default):
+    """Element-wise numerator / denominator, using `default` where denominator <= 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.broadcast_to(np.asarray(denominator, dtype=np.float64), numerator.shape)
+    out = np.full(numerator.shape, default, dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def extract_features_batch(texts, sizes, fonts, bboxes, page_width, page_height, avg_font_size):
+    """
+    Columnar version of extract_features for many spans at once.
+
+    Args:
+        texts (sequence of str): Raw span texts.
+        sizes (array-like): Font size of each span.
+        fonts (sequence of str): Font name of each span.
+        bboxes (array-like): (n, 4) array of span bounding boxes.
+        page_width, page_height, avg_font_size (float or array-like): Page
+            statistics, either one value for all spans or one value per span.
+
+    Returns:
+        np.ndarray: (n, len(FEATURE_NAMES)) float64 matrix whose columns follow
+        FEATURE_NAMES. Row i holds the same values extract_features would
+        return for span i.
+    """
+    n = len(texts)
+    matrix = np.empty((n, len(FEATURE_NAMES)), dtype=np.float64)
+    if n == 0:
+        return matrix
+
+    sizes = np.asarray(sizes, dtype=np.float64)
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(n, 4)
+    page_width = np.broadcast_to(np.asarray(page_width, dtype=np.float64), (n,))
+    page_height = np.broadcast_to(np.asarray(page_height, dtype=np.float64), (n,))
+
+    # Text-based features (string work has no vectorized equivalent)
+    stripped = [text.strip() for text in texts]
+    matrix[:, 0] = [len(text) for text in stripped]
+    matrix[:, 1] = [1 if _NUMBER_PREFIX.match(text) else 0 for text in stripped]
+    matrix[:, 2] = [1 if text.isupper() and len(text) > 1 else 0 for text in stripped]
+
+    # Font and style features
+    matrix[:, 3] = sizes
+    matrix[:, 4] = _safe_divide(sizes, avg_font_size, 1)
+    matrix[:, 5] = [1 if "bold" in font.lower() else 0 for font in fonts]
+
+    # Positional features
+    matrix[:, 6] = _safe_divide(bboxes[:, 0], page_width, 0)
+    matrix[:, 7] = _safe_divide(bboxes[:, 1], page_height, 0)
+    span_center = (bboxes[:, 0] + bboxes[:, 2]) / 2
+    matrix[:, 8] = _safe_divide(np.abs(span_center - page_width / 2), page_width, 0)
+
+    return matrix
+
+
+def extract_features_from_spans(spans, page_width, page_height, avg_font_size):
+    """
+    Convenience wrapper around extract_features_batch for PyMuPDF span dicts.
+    """
+    return extract_features_batch(
+        [span['text'] for span in spans],
+        [span['size'] for span in spans],
+        [span['font'] for span in spans],
+        [span['bbox'] for span in spans],
+        page_width, page_height, avg_font_size,
+    )
@@ -0,0 +1,151 @@
+# src/feature_store.py
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from . import config
+from . import disk_cache
+from . import feature_extractor
+from . import hashing
+from . import layout as document_layout
+from . import parallel
+
+# Bump when the features or the shard layout change so stale shards are ignored
+FEATURE_STORE_VERSION = 1
+
+# Lists the shards that make up the current training set
+DATASET_FILE = 'dataset.json'
+
+
+def feature_shard_path(store_dir: str, pdf_path: str) -> str:
+    """
+    Feature shard of one PDF, keyed by the PDF's content hash.
+    """
+    return os.path.join(store_dir, f"{hashing.file_digest(pdf_path)}-v{FEATURE_STORE_VERSION}.npz")
+
+
+def label_shard_path(store_dir: str, pdf_path: str, json_path: str) -> str:
+    """
+    Labels of one PDF, keyed by both the PDF and the ground-truth JSON, so a
+    label change only relabels that document.
+    """
+    return os.path.join(
+        store_dir,
+        f"{hashing.file_digest(pdf_path)}-{hashing.file_digest(json_path)}-v{FEATURE_STORE_VERSION}.labels.npy",
+    )
+
+
+def write_feature_shard(pdf_path: str, shard_path: str):
+    """
+    Extracts the features of every non-empty span of a PDF into a shard:
+    the feature matrix plus each span's page and stripped text (used to
+    match the ground truth).
+    """
+    layout = document_layout.extract_layout(pdf_path)
+    span_indices = layout.non_empty_spans()
+    texts = [text.strip() for text in layout.texts(span_indices)]
+    disk_cache.write_atomic(shard_path, lambda f: np.savez_compressed(
+        f,
+        features=layout.features(span_indices),
+        page=layout.page[span_indices],
+        texts=np.array(texts, dtype=str),
+    ), binary=True)
+
+
+def write_label_shard(json_path: str, feature_shard: str, label_path: str):
+    """
+    Labels the spans of a feature shard from a ground-truth JSON.
+    """
+    # create_training_data imports this module
+    from . import create_training_data
+
+    heading_lookup = create_training_data.load_heading_lookup(json_path)
+    with np.load(feature_shard) as shard:
+        labels = create_training_data.label_spans(heading_lookup, shard['page'], shard['texts'])
+    disk_cache.write_atomic(label_path, lambda f: np.save(f, np.array(labels, dtype=str)), binary=True)
+
+
+def _shard_task(task):
+    """
+    Worker entry point: (re)builds whichever shards of one document are missing.
+    """
+    pdf_path, json_path, store_dir = task
+    feature_shard = feature_shard_path(store_dir, pdf_path)
+    label_path = label_shard_path(store_dir, pdf_path, json_path)
+    built = []
+    if not os.path.exists(feature_shard):
+        write_feature_shard(pdf_path, feature_shard)
+        built.append('features')
+    if not os.path.exists(label_path):
+        write_label_shard(json_path, feature_shard, label_path)
+        built.append('labels')
+    return feature_shard, label_path, built
+
+
+def build_store(samples_dir: str = None, store_dir: str = None, workers: int = 1) -> str:
+    """
+    Brings the feature store up to date with the labeled PDFs in `samples_dir`.
+
+    Each PDF with a ground-truth JSON gets a feature shard and a label shard;
+    existing shards are reused, so only new or changed documents (or changed
+    labels) are processed, in a pool of `workers` processes. Returns the path
+    of the dataset file listing the shards of the training set.
+    """
+    samples_dir = samples_dir or config.SAMPLES_DIR
+    store_dir = store_dir or config.FEATURE_STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+
+    # create_training_data imports this module
+    from . import create_training_data
+
+    tasks = [
+        (pdf_path, json_path, store_dir)
+        for pdf_path, json_path in create_training_data.labeled_sample_pdfs(samples_dir)
+    ]
+
+    pool = parallel.create_pool(workers)
+    try:
+        results = parallel.map_tasks(pool, _shard_task, tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    documents = []
+    n_features = n_labels = 0
+    for (pdf_path, _, _), (feature_shard, label_path, built) in zip(tasks, results):
+        n_features += 'features' in built
+        n_labels += 'labels' in built
+        documents.append({
+            "pdf": os.path.basename(pdf_path),
+            "features": os.path.basename(feature_shard),
+            "labels": os.path.basename(label_path),
+        })
+    dataset_path = os.path.join(store_dir, DATASET_FILE)
+    disk_cache.write_atomic(dataset_path, lambda f: json.dump({"documents": documents}, f, indent=4))
+    print(f"Feature store: {len(tasks)} documents, {n_features} feature shards and {n_labels} label shards rebuilt.")
+    return dataset_path
+
+
+def load_dataset(dataset_path: str = None) -> tuple:
+    """
+    Concatenates the shards listed in a dataset file into (X, y): a feature
+    DataFrame with the training column names and dtypes, and the labels.
+    """
+    dataset_path = dataset_path or os.path.join(config.FEATURE_STORE_DIR, DATASET_FILE)
+    store_dir = os.path.dirname(dataset_path)
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    matrices, labels = [], []
+    for document in documents:
+        with np.load(os.path.join(store_dir, document["features"])) as shard:
+            matrices.append(shard['features'])
+        labels.append(np.load(os.path.join(store_dir, document["labels"])))
+
+    n_columns = len(feature_extractor.FEATURE_NAMES)
+    matrix = np.concatenate(matrices) if matrices else np.empty((0, n_columns))
+    X = pd.DataFrame(matrix, columns=feature_extractor.FEATURE_NAMES).astype(feature_extractor.FEATURE_DTYPES)
+    y = pd.Series(np.concatenate(labels) if labels else np.empty(0, dtype=str), name='label')
+    return X, y
@@ -0,0 +1,242 @@
+# src/forest_engine.py
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from . import config
+from . import hashing
+
+# Marker stored in the feature array for leaf nodes
+LEAF = -1
+
+
+def compiled_path(model_path: str) -> str:
+    """
+    Location of the compiled forest exported from a joblib model.
+    """
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def export_forest(model, path: str, source_digest: str = ""):
+    """
+    Flattens a fitted sklearn RandomForestClassifier into packed arrays.
+
+    All trees share one node table; children are global node indices and
+    leaves point to themselves, so traversal can run a fixed number of steps.
+    Leaf class distributions are normalized per tree exactly as sklearn's
+    DecisionTreeClassifier.predict_proba does.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(n_nodes)
+
+        features.append(np.where(is_leaf, LEAF, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+        proba = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(proba / normalizer)
+
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    np.savez(
+        path,
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts).astype(np.int32),
+        right=np.concatenate(rights).astype(np.int32),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int32),
+        max_depth=np.array(max_depth),
+        classes=np.array([str(c) for c in model.classes_]),
+        feature_names=np.array([str(name) for name in model.feature_names_in_]),
+        source_digest=np.array(source_digest),
+    )
+
+
+def read_source_digest(path: str) -> str:
+    """
+    Digest of the joblib model a compiled forest was exported from.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return str(data['source_digest'])
+
+
+class CompiledForest:
+    """
+    Pure-NumPy evaluator for a forest exported by export_forest.
+
+    All trees are traversed for the whole feature matrix at once: each step
+    advances every (sample, tree) pair by one level.
+    """
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            feature = data['feature']
+            threshold = data['threshold']
+            left = data['left']
+            right = data['right']
+            self.value = data['value']
+            self.roots = data['roots']
+            self.max_depth = int(data['max_depth'])
+            self.classes_ = data['classes']
+            self.feature_names_in_ = data['feature_names']
+            self.source_digest = str(data['source_digest'])
+
+        leaf = feature == LEAF
+        self.feature = np.where(leaf, 0, feature).astype(np.intp)
+        # sklearn compares float32 inputs against float64 thresholds. Rounding
+        # each threshold down to the nearest float32 gives the same decisions
+        # with a float32 comparison. Leaves get +inf so they always "go left"
+        # to themselves.
+        threshold32 = threshold.astype(np.float32)
+        too_high = threshold32.astype(np.float64) > threshold
+        threshold32[too_high] = np.nextafter(threshold32[too_high], np.float32(-np.inf))
+        threshold32[leaf] = np.inf
+        self.threshold = threshold32
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.stack([left, right], axis=1).astype(np.intp).ravel()
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Leaf node index of every sample in every tree, shape (n_samples, n_trees).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+        nodes = np.tile(self.roots.astype(np.intp), n_samples)
+        row_offset = np.repeat(np.arange(n_samples, dtype=np.intp) * n_features, n_trees)
+
+        # Only (sample, tree) pairs that have not reached a leaf are advanced
+        active = np.arange(len(nodes), dtype=np.intp)
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            go_right = flat_X[row_offset[active] + self.feature[current]] > self.threshold[current]
+            following = self.children[2 * current + go_right]
+            nodes[active] = following
+            active = active[following != current]
+            if len(active) == 0:
+                break
+        return nodes.reshape(n_samples, n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = np.zeros((len(leaves), self.value.shape[1]), dtype=np.float64)
+        # Accumulate tree by tree, in the same order as sklearn, for identical rounding
+        for tree in range(leaves.shape[1]):
+            proba += self.value[leaves[:, tree]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if len(X) == 0:
+            return self.classes_[:0]
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def export_model(model_path: str = config.MODEL_PATH) -> str:
+    """
+    Compiles the joblib model at `model_path` next to it and returns the path.
+    """
+    import joblib
+
+    path = compiled_path(model_path)
+    export_forest(joblib.load(model_path), path, hashing.file_digest(model_path))
+    return path
+
+
+def _sample_matrices() -> list:
+    """
+    One feature matrix per sample PDF, covering every non-empty span and
+    every block-leading span (the inputs of main.py and document_parser.py).
+    """
+    from . import layout as document_layout
+
+    matrices = []
+    for filename in sorted(os.listdir(config.SAMPLES_DIR)):
+        if filename.endswith('.pdf'):
+            layout = document_layout.extract_layout(os.path.join(config.SAMPLES_DIR, filename))
+            matrices.append(np.concatenate([
+                layout.features(layout.non_empty_spans()),
+                layout.features(layout.block_starts()),
+            ]))
+    return matrices
+
+
+def _time(run, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - start) / repeat
+
+
+def _cold_start(backend: str, model_path: str) -> float:
+    """
+    Wall time of a fresh interpreter that imports the classifier and loads the model.
+    """
+    code = (
+        "from src import heading_classifier; "
+        f"heading_classifier.HeadingClassifier({model_path!r}, backend={backend!r})"
+    )
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=config.BASE_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def verify(model_path: str = config.MODEL_PATH, repeat: int = 5) -> bool:
+    """
+    Checks that the compiled forest predicts exactly what sklearn predicts on
+    the sample PDFs, and benchmarks both backends.
+    """
+    from . import heading_classifier
+
+    sklearn_model = heading_classifier.HeadingClassifier(model_path, backend='sklearn')
+    compiled_model = heading_classifier.HeadingClassifier(model_path, backend='compiled')
+    matrices = _sample_matrices()
+    X = np.concatenate(matrices)
+
+    mismatches = int(np.sum(np.asarray(sklearn_model.predict(X)) != np.asarray(compiled_model.predict(X))))
+    print(f"Parity: {len(X) - mismatches}/{len(X)} sample predictions identical")
+
+    print(f"{'':>10} {'cold start':>12} {'per document':>14} {'one batch':>12}")
+    timings = {}
+    for name, model in (('sklearn', sklearn_model), ('compiled', compiled_model)):
+        timings[name] = (
+            _cold_start(name, model_path),
+            _time(lambda: [model.predict(matrix) for matrix in matrices], repeat),
+            _time(lambda: model.predict(X), repeat),
+        )
+        cold, per_document, batch = timings[name]
+        print(f"{name:>10} {cold * 1000:>10.0f}ms {per_document * 1000:>12.1f}ms {batch * 1000:>10.1f}ms")
+    speedups = [s / c for s, c in zip(timings['sklearn'], timings['compiled'])]
+    print(f"{'speedup':>10} {speedups[0]:>11.1f}x {speedups[1]:>13.1f}x {speedups[2]:>11.1f}x")
+    print(f"({len(matrices)} sample PDFs, {len(X)} spans)")
+    return mismatches == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile the heading RandomForest into a NumPy-only evaluator.")
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f"Compiled forest saved to {export_model(args.model)}")
+    elif not verify(args.model):
+        raise SystemExit("Compiled forest does not match the sklearn model")
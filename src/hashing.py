@@ -0,0 +1,39 @@
+# src/hashing.py
+
+import glob
+import hashlib
+import os
+
+_READ_SIZE = 1 << 20
+
+# {path: (size, mtime_ns, digest)}; avoids re-reading unchanged files within a run
+_DIGESTS = {}
+
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 of a file's content, read in 1 MiB blocks.
+    """
+    stat = os.stat(path)
+    cached = _DIGESTS.get(path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_SIZE), b''):
+            digest.update(block)
+    _DIGESTS[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def code_digest() -> str:
+    """
+    SHA-256 over the source files of this package, so cached results are
+    invalidated whenever the code that produced them changes.
+    """
+    digest = hashlib.sha256()
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(source_dir, '*.py'))):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update(file_digest(path).encode('utf-8'))
+    return digest.hexdigest()
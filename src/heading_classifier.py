@@ -0,0 +1,127 @@
+# src/heading_classifier.py
+
+import hashlib
+import os
+import numpy as np
+
+from . import cascade
+from . import config
+from . import feature_extractor
+from . import forest_engine
+from . import hashing
+from . import instrumentation
+
+HEADING_LABELS = ("H1", "H2", "H3")
+BODY_LABEL = config.LABELS[-1]
+
+
+class HeadingClassifier:
+    """
+    Batched wrapper around the trained heading model.
+
+    Spans are classified as one feature matrix (columns in
+    feature_extractor.FEATURE_NAMES order) with a single predict call, instead
+    of one DataFrame and one predict call per span.
+
+    backend selects the evaluator:
+        'sklearn'  - the joblib RandomForest (imports sklearn and pandas)
+        'compiled' - the NumPy forest exported next to it (see forest_engine)
+        'auto'     - 'compiled' if an export of this exact model exists
+
+    Unless `use_cascade` is False, the rule cascade learned for this model
+    (see cascade.py) labels obvious body text first, and only the remaining
+    rows are evaluated; `evaluated` and `skipped` count the rows of each kind.
+    """
+
+    def __init__(self, model_path: str = config.MODEL_PATH, backend: str = None, use_cascade: bool = None):
+        backend = backend or config.HEADING_BACKEND
+        if backend == 'auto':
+            backend = 'compiled' if _has_current_export(model_path) else 'sklearn'
+        self.backend = backend
+
+        if backend == 'compiled':
+            self.model = forest_engine.CompiledForest(forest_engine.compiled_path(model_path))
+        elif backend == 'sklearn':
+            import joblib
+            self.model = joblib.load(model_path)
+        else:
+            raise ValueError(f"Unknown heading classifier backend: {backend}")
+        self.feature_names = list(self.model.feature_names_in_)
+        self._column_order = [feature_extractor.FEATURE_NAMES.index(name) for name in self.feature_names]
+        self.cascade = cascade.load_for_model(model_path) if use_cascade is not False else None
+        self.evaluated = self.skipped = 0
+
+        # Identifies what this classifier predicts, for caches of its results
+        model_file = forest_engine.compiled_path(model_path) if backend == 'compiled' else model_path
+        parts = [hashing.file_digest(model_file)]
+        if self.cascade is not None:
+            parts.append(hashing.file_digest(config.HEADING_CASCADE_PATH))
+        self.fingerprint = hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def predict(self, feature_matrix):
+        """
+        Predicts a label for every row of the feature matrix.
+        """
+        if len(feature_matrix) == 0:
+            return []
+        if self.cascade is None:
+            self.evaluated += len(feature_matrix)
+            return self._predict(feature_matrix)
+
+        ambiguous = ~self.cascade.body_mask(feature_matrix)
+        n_ambiguous = int(ambiguous.sum())
+        self.evaluated += n_ambiguous
+        self.skipped += len(feature_matrix) - n_ambiguous
+        instrumentation.count("cascade_skipped", len(feature_matrix) - n_ambiguous)
+        predictions = np.full(len(feature_matrix), BODY_LABEL, dtype=object)
+        if n_ambiguous:
+            predictions[ambiguous] = self._predict(feature_matrix[ambiguous])
+        return predictions
+
+    def _predict(self, feature_matrix):
+        if self.backend == 'compiled':
+            return self.model.predict(feature_matrix[:, self._column_order])
+
+        import pandas as pd
+        # Build the frame once per batch and reorder to the training column order
+        with instrumentation.stage("dataframe"):
+            features_df = pd.DataFrame(feature_matrix, columns=feature_extractor.FEATURE_NAMES)
+        return self.model.predict(features_df[self.feature_names])
+
+    def predict_spans(self, spans, page_width, page_height, avg_font_size):
+        """
+        Extracts features for a list of PyMuPDF spans and classifies them in one call.
+        """
+        matrix = feature_extractor.extract_features_from_spans(
+            spans, page_width, page_height, avg_font_size
+        )
+        return self.predict(matrix)
+
+
+def _has_current_export(model_path: str) -> bool:
+    """
+    True if the compiled forest next to `model_path` was exported from it.
+    """
+    path = forest_engine.compiled_path(model_path)
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    return forest_engine.read_source_digest(path) == hashing.file_digest(model_path)
+
+
+def is_heading(label) -> bool:
+    return label in HEADING_LABELS
+
+
+_CLASSIFIERS = {}
+
+
+def get_classifier(model_path: str = config.MODEL_PATH) -> HeadingClassifier:
+    """
+    Returns a process-wide HeadingClassifier, loading the model on first use.
+    """
+    classifier = _CLASSIFIERS.get(model_path)
+    if classifier is None:
+        classifier = _CLASSIFIERS[model_path] = HeadingClassifier(model_path)
+    return classifier
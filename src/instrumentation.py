@@ -0,0 +1,216 @@
+# src/instrumentation.py
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Off by default; every hook below returns immediately until enable() is called
+_enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_timers = {}    # (document, stage) -> [calls, seconds]
+_counters = {}  # (document, counter) -> value
+_events = []    # Chrome trace events ("X" complete events)
+_origin = time.perf_counter()
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# Label for work that does not belong to a single document (model loading, ranking, ...)
+NO_DOCUMENT = ""
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Drops everything recorded so far.
+    """
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _events.clear()
+
+
+def current_document() -> str:
+    return getattr(_local, 'document', NO_DOCUMENT)
+
+
+@contextlib.contextmanager
+def _document(name: str):
+    previous = current_document()
+    _local.document = name
+    try:
+        yield
+    finally:
+        _local.document = previous
+
+
+def document(name: str):
+    """
+    Context manager attributing the stages and counters recorded inside it
+    to document `name` (usually the PDF's file name).
+    """
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _document(os.path.basename(name))
+
+
+@contextlib.contextmanager
+def _stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        doc = current_document()
+        with _lock:
+            timer = _timers.setdefault((doc, name), [0, 0.0])
+            timer[0] += 1
+            timer[1] += end - start
+            _events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - _origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"document": doc},
+            })
+
+
+def stage(name: str):
+    """
+    Context manager timing one stage (e.g. "get_text", "predict") of the
+    current document.
+    """
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _stage(name)
+
+
+def count(name: str, value: int = 1):
+    """
+    Adds `value` to counter `name` (pages, spans, chunks, ...) of the current document.
+    """
+    if not _enabled:
+        return
+    key = (current_document(), name)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+# --- Worker processes ---
+# Pool workers record into their own process; map_tasks ships each task's
+# records back with its result and merges them into the parent.
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "timers": [[doc, name, calls, seconds] for (doc, name), (calls, seconds) in _timers.items()],
+            "counters": [[doc, name, value] for (doc, name), value in _counters.items()],
+            "events": list(_events),
+            "origin": _origin,
+        }
+
+
+def merge(records: dict):
+    # Worker clocks have their own origin; align them on the parent's
+    shift = (records["origin"] - _origin) * 1e6
+    with _lock:
+        for doc, name, calls, seconds in records["timers"]:
+            timer = _timers.setdefault((doc, name), [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+        for doc, name, value in records["counters"]:
+            _counters[(doc, name)] = _counters.get((doc, name), 0) + value
+        for event in records["events"]:
+            _events.append(dict(event, ts=event["ts"] + shift))
+
+
+def run_profiled(func, task):
+    """
+    Worker entry point wrapping `func`: returns (result, records of this task).
+    """
+    enable()
+    reset()
+    result = func(task)
+    return result, snapshot()
+
+
+# --- Output ---
+
+def summary() -> dict:
+    """
+    Per-document stage timings and counters, plus totals over all documents.
+    """
+    documents, totals = {}, {"stages": {}, "counters": {}}
+    with _lock:
+        for (doc, name), (calls, seconds) in _timers.items():
+            entry = documents.setdefault(doc, {"stages": {}, "counters": {}})
+            entry["stages"][name] = {"calls": calls, "seconds": round(seconds, 6)}
+            total = totals["stages"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            total["calls"] += calls
+            total["seconds"] = round(total["seconds"] + seconds, 6)
+        for (doc, name), value in _counters.items():
+            documents.setdefault(doc, {"stages": {}, "counters": {}})["counters"][name] = value
+            totals["counters"][name] = totals["counters"].get(name, 0) + value
+    return {"documents": documents, "totals": totals}
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text() -> str:
+    """
+    The timers and counters in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP pdf_stage_seconds_total Time spent in each stage.",
+        "# TYPE pdf_stage_seconds_total counter",
+    ]
+    with _lock:
+        timers = sorted(_timers.items())
+        counters = sorted(_counters.items())
+    for (doc, name), (calls, seconds) in timers:
+        lines.append(f'pdf_stage_seconds_total{{document="{_label(doc)}",stage="{_label(name)}"}} {seconds:.6f}')
+    lines += [
+        "# HELP pdf_stage_calls_total Number of times each stage ran.",
+        "# TYPE pdf_stage_calls_total counter",
+    ]
+    for (doc, name), (calls, seconds) in timers:
+        lines.append(f'pdf_stage_calls_total{{document="{_label(doc)}",stage="{_label(name)}"}} {calls}')
+    lines += [
+        "# HELP pdf_items_total Items processed (pages, spans, chunks, ...).",
+        "# TYPE pdf_items_total counter",
+    ]
+    for (doc, name), value in counters:
+        lines.append(f'pdf_items_total{{document="{_label(doc)}",item="{_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path: str):
+    """
+    Writes the JSON trace to `path` (loadable in chrome://tracing or
+    Perfetto, with the summary alongside) and the Prometheus text next to
+    it, with a .prom extension.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _lock:
+        events = sorted(_events, key=lambda event: event["ts"])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", **summary()}, f, indent=1)
+    prom_path = os.path.splitext(path)[0] + '.prom'
+    with open(prom_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    print(f"Profile saved to {path} and {prom_path}")
@@ -0,0 +1,310 @@
+# src/layout.py
+
+import os
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from . import config
+from . import disk_cache
+from . import feature_extractor
+from . import hashing
+from . import instrumentation
+from . import ocr
+
+# Bump when the stored arrays change so stale cache files are ignored
+LAYOUT_VERSION = 1
+
+# Average font size assumed for pages without any text
+DEFAULT_FONT_SIZE = 12
+
+# get_text("dict") flags without image blocks: only text spans are used, and
+# image blocks would carry their binary payload into memory
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+class DocumentLayout:
+    """
+    Columnar table of every text span in a PDF, built from one
+    page.get_text("dict") call per page.
+
+    Span columns (one entry per span, in reading order):
+        size, flags, font_id, bbox (n, 4), block_id, line_id, page
+    Span texts are stored as one string plus offsets. Block and line ids
+    number the text blocks and lines of the table consecutively; `page` is
+    the 0-based page number in the PDF.
+
+    Page columns (one entry per parsed page, starting at `first_page`):
+        width, height, avg_font_size, span_start (n_pages + 1 offsets)
+
+    `ocr_complete` is False when scanned pages were left without text
+    because OCR failed or ran out of time; such layouts are not cached.
+    """
+
+    ocr_complete = True
+
+    ARRAYS = (
+        'text_offsets', 'size', 'flags', 'font_id', 'bbox', 'block_id', 'line_id', 'page',
+        'page_width', 'page_height', 'avg_font_size', 'span_start',
+    )
+
+    def __init__(self, text_blob: str, fonts: list, first_page: int = 0, **arrays):
+        self.text_blob = text_blob
+        self.fonts = list(fonts)
+        self.first_page = int(first_page)
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @property
+    def n_spans(self) -> int:
+        return len(self.size)
+
+    @property
+    def n_pages(self) -> int:
+        return len(self.page_width)
+
+    def text(self, i: int) -> str:
+        return self.text_blob[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def texts(self, indices=None) -> list:
+        offsets = self.text_offsets
+        if indices is None:
+            indices = range(self.n_spans)
+        return [self.text_blob[offsets[i]:offsets[i + 1]] for i in indices]
+
+    def page_span_range(self, page_num: int) -> range:
+        """
+        Span indices of a page, given its 0-based page number in the PDF.
+        """
+        local = page_num - self.first_page
+        return range(self.span_start[local], self.span_start[local + 1])
+
+    def non_empty_spans(self) -> np.ndarray:
+        """
+        Indices of spans whose text is not just whitespace.
+        """
+        return np.array([i for i, text in enumerate(self.texts()) if text.strip()], dtype=np.int64)
+
+    def block_starts(self) -> np.ndarray:
+        """
+        Index of the first span of every text block.
+        """
+        if self.n_spans == 0:
+            return np.empty(0, dtype=np.int64)
+        changes = np.flatnonzero(np.diff(self.block_id)) + 1
+        return np.concatenate(([0], changes)).astype(np.int64)
+
+    def features(self, indices) -> np.ndarray:
+        """
+        Feature matrix (see feature_extractor.FEATURE_NAMES) for the given spans.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        pages = self.page[indices] - self.first_page
+        return feature_extractor.extract_features_batch(
+            self.texts(indices),
+            self.size[indices],
+            [self.fonts[font_id] for font_id in self.font_id[indices]],
+            self.bbox[indices],
+            self.page_width[pages],
+            self.page_height[pages],
+            self.avg_font_size[pages],
+        )
+
+    # --- Serialization ---
+
+    def save(self, path: str):
+        # Threads and processes may save the same layout at once
+        disk_cache.write_atomic(path, lambda f: np.savez(
+            f,
+            text_blob=np.frombuffer(self.text_blob.encode('utf-8'), dtype=np.uint8),
+            fonts=np.array(self.fonts, dtype=str),
+            first_page=np.array(self.first_page),
+            **{name: getattr(self, name) for name in self.ARRAYS},
+        ), binary=True)
+
+    @classmethod
+    def load(cls, path: str) -> 'DocumentLayout':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['text_blob'].tobytes().decode('utf-8'),
+                data['fonts'].tolist(),
+                int(data['first_page']),
+                **{name: data[name] for name in cls.ARRAYS},
+            )
+
+
+def page_count(pdf_path: str) -> int:
+    doc = fitz.open(pdf_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def _parse_document(doc, start: int, stop: int, ocr_blocks: dict = None) -> DocumentLayout:
+    """
+    Walks pages [start, stop) of an open fitz document once and builds their
+    layout table.
+
+    `ocr_blocks` optionally maps page numbers to OCR text blocks (see
+    ocr.ocr_image) used instead of the page's own (empty) text layer.
+    """
+    ocr_blocks = ocr_blocks or {}
+    texts, sizes, flags, font_ids, bboxes = [], [], [], [], []
+    block_ids, line_ids, pages = [], [], []
+    page_widths, page_heights, avg_font_sizes, span_start = [], [], [], [0]
+    fonts, font_lookup = [], {}
+    block_id = line_id = 0
+
+    for page_num in range(start, stop):
+        page = doc[page_num]
+        page_sizes = []
+        if page_num in ocr_blocks:
+            blocks = ocr_blocks[page_num]
+        else:
+            with instrumentation.stage("get_text"):
+                blocks = page.get_text("dict", flags=TEXT_FLAGS)["blocks"]
+        for block in blocks:
+            if 'lines' not in block:
+                continue
+            block_has_spans = False
+            for line in block['lines']:
+                if not line['spans']:
+                    continue
+                for span in line['spans']:
+                    font_id = font_lookup.get(span['font'])
+                    if font_id is None:
+                        font_id = font_lookup[span['font']] = len(fonts)
+                        fonts.append(span['font'])
+                    texts.append(span['text'])
+                    sizes.append(span['size'])
+                    flags.append(span['flags'])
+                    font_ids.append(font_id)
+                    bboxes.append(span['bbox'])
+                    block_ids.append(block_id)
+                    line_ids.append(line_id)
+                    pages.append(page_num)
+                    page_sizes.append(span['size'])
+                line_id += 1
+                block_has_spans = True
+            if block_has_spans:
+                block_id += 1
+
+        page_rect = page.rect
+        page_widths.append(page_rect.width)
+        page_heights.append(page_rect.height)
+        # Plain sum() keeps the average bit-identical to the per-span code paths
+        avg_font_sizes.append(sum(page_sizes) / len(page_sizes) if page_sizes else DEFAULT_FONT_SIZE)
+        span_start.append(len(texts))
+
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+    return DocumentLayout(
+        "".join(texts),
+        fonts,
+        first_page=start,
+        text_offsets=text_offsets,
+        size=np.array(sizes, dtype=np.float64),
+        flags=np.array(flags, dtype=np.int32),
+        font_id=np.array(font_ids, dtype=np.int32),
+        bbox=np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+        block_id=np.array(block_ids, dtype=np.int32),
+        line_id=np.array(line_ids, dtype=np.int32),
+        page=np.array(pages, dtype=np.int32),
+        page_width=np.array(page_widths, dtype=np.float64),
+        page_height=np.array(page_heights, dtype=np.float64),
+        avg_font_size=np.array(avg_font_sizes, dtype=np.float64),
+        span_start=np.array(span_start, dtype=np.int64),
+    )
+
+
+def _cache_path(pdf_path: str, pages) -> str:
+    digest = hashing.file_digest(pdf_path)
+    suffix = f"-p{pages[0]}-{pages[1]}" if pages is not None else ""
+    # Layouts built with and without OCR differ for scanned pages
+    if ocr.is_available():
+        suffix += "-ocr"
+    return os.path.join(config.LAYOUT_CACHE_DIR, f"{digest}{suffix}-v{LAYOUT_VERSION}.npz")
+
+
+def _with_ocr(doc, layout: DocumentLayout, start: int, stop: int, budget=None) -> DocumentLayout:
+    """
+    Re-parses the range with OCR text for pages that have no text layer but
+    do have images or drawings; returns `layout` itself if there are none.
+    OCR time is charged to `budget` (see ocr.Budget).
+    """
+    empty_pages = [start + int(i) for i in np.flatnonzero(np.diff(layout.span_start) == 0)]
+    if not empty_pages or not ocr.is_available():
+        return layout
+    scanned = [page_num for page_num in empty_pages if ocr.needs_ocr(doc[page_num])]
+    ocr_blocks = ocr.ocr_pages(doc, scanned, budget) if scanned else {}
+    if ocr_blocks:
+        with instrumentation.stage("parse_layout"):
+            layout = _parse_document(doc, start, stop, ocr_blocks)
+    if len(ocr_blocks) < len(scanned):
+        layout.ocr_complete = False
+    return layout
+
+
+def iter_pages(pdf_path: str):
+    """
+    Yields a one-page DocumentLayout per page of a PDF, parsing each page
+    only when it is requested, so memory stays flat however long the
+    document is. Page layouts are not cached; all pages share one OCR budget.
+    """
+    budget = ocr.Budget()
+    with instrumentation.stage("fitz_open"):
+        doc = fitz.open(pdf_path)
+    try:
+        for page_num in range(len(doc)):
+            with instrumentation.stage("parse_layout"):
+                layout = _parse_document(doc, page_num, page_num + 1)
+            yield _with_ocr(doc, layout, page_num, page_num + 1, budget)
+    finally:
+        doc.close()
+
+
+def extract_layout(pdf_path: str, pages: tuple = None, use_cache: bool = None) -> DocumentLayout:
+    """
+    Returns the span layout of a PDF, reusing the cached copy for files whose
+    content has been parsed before.
+
+    `pages` optionally restricts parsing to the page range (start, stop).
+    """
+    if use_cache is None:
+        use_cache = config.LAYOUT_CACHE_ENABLED
+    cache_path = _cache_path(pdf_path, pages) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with instrumentation.stage("layout_cache_load"):
+                layout = DocumentLayout.load(cache_path)
+            instrumentation.count("layout_cache_hits")
+            disk_cache.touch(cache_path)
+            return layout
+        except (OSError, ValueError, KeyError):
+            pass  # Corrupt or partial cache file; parse again
+    if cache_path:
+        instrumentation.count("layout_cache_misses")
+
+    with instrumentation.stage("fitz_open"):
+        doc = fitz.open(pdf_path)
+    try:
+        start, stop = pages if pages is not None else (0, len(doc))
+        stop = min(stop, len(doc))
+        with instrumentation.stage("parse_layout"):
+            layout = _parse_document(doc, start, stop)
+        layout = _with_ocr(doc, layout, start, stop)
+    finally:
+        doc.close()
+    if instrumentation.is_enabled():
+        instrumentation.count("pages", layout.n_pages)
+        instrumentation.count("spans", layout.n_spans)
+        instrumentation.count("blocks", len(layout.block_starts()))
+
+    # A layout with pages OCR didn't finish is retried on the next run
+    if cache_path and layout.ocr_complete:
+        os.makedirs(config.LAYOUT_CACHE_DIR, exist_ok=True)
+        with instrumentation.stage("layout_cache_save"):
+            layout.save(cache_path)
+            disk_cache.prune(config.LAYOUT_CACHE_DIR, config.LAYOUT_CACHE_MAX_MB)
+    return layout
@@ -2,93 +2,234 @@
 
 import os
 import json
-import pandas as pd
-import fitz # PyMuPDF
-import joblib
+import argparse
 
 from . import config
-from . import feature_extractor
+from . import disk_cache
+from . import document_engine
+from . import hashing
+from . import heading_classifier
+from . import instrumentation
+from . import layout as document_layout
+from . import manifest
+from . import parallel
 
-def process_pdfs():
+
+def extract_title(layout) -> str:
     """
-    Processes all PDFs in the input directory and generates structured JSON output.
+    The title of a parsed layout (see document_engine.extract_title).
+    """
+    return document_engine.extract_title(layout)
+
+
+def extract_outline(layout, classifier) -> list:
+    """
+    Classifies every non-empty span with a single batched predict call and
+    returns the ones predicted as headings.
+    """
+    span_indices = layout.non_empty_spans()
+    with instrumentation.stage("features"):
+        features = layout.features(span_indices)
+    with instrumentation.stage("predict"):
+        predictions = classifier.predict(features)
+    instrumentation.count("predictions", len(predictions))
+    return document_engine.outline_entries(layout, span_indices, predictions)
+
+
+def process_pdf(pdf_path: str, classifier=None) -> dict:
+    """
+    Builds the output JSON (title and outline) for a single PDF.
+    """
+    classifier = classifier or heading_classifier.get_classifier(config.MODEL_PATH)
+    with instrumentation.document(pdf_path):
+        analysis = document_engine.analyze(pdf_path, classifier=classifier)
+    return {
+        "title": analysis["title"],
+        "outline": analysis["outline"]
+    }
+
+
+def iter_outline(pdf_path: str, classifier=None):
     """
-    # Load the trained model
-    model = joblib.load(config.MODEL_PATH)
-    feature_names = model.feature_names_in_
+    Streaming counterpart of process_pdf: yields {"title": ...} followed by
+    the outline entries, parsing and classifying one page at a time.
+    """
+    classifier = classifier or heading_classifier.get_classifier(config.MODEL_PATH)
+    with instrumentation.document(pdf_path):
+        title_sent = False
+        for layout in document_layout.iter_pages(pdf_path):
+            if not title_sent:
+                yield {"title": extract_title(layout)}
+                title_sent = True
+            yield from extract_outline(layout, classifier)
+        if not title_sent:
+            yield {"title": ""}
+
+
+def write_outline_jsonl(pdf_path: str, output_path: str, classifier=None):
+    """
+    Writes iter_outline's records to `output_path` as JSON Lines, one record
+    per line as soon as its page is processed.
+    """
+    def write(f):
+        for record in iter_outline(pdf_path, classifier):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    disk_cache.write_atomic(output_path, write)
+
+
+def _output_path(pdf_filename: str, stream: bool = False) -> str:
+    extension = '.jsonl' if stream else '.json'
+    return os.path.join(config.OUTPUT_DIR, pdf_filename.replace('.pdf', extension))
 
+
+def _outline_task(task):
+    """
+    Worker entry point: title and outline for one page range of one PDF,
+    plus the number of model evaluations the cascade skipped and ran.
+    """
+    pdf_path, pages = task
+    with instrumentation.stage("load_model"):
+        classifier = heading_classifier.get_classifier(config.MODEL_PATH)
+    skipped, evaluated = classifier.skipped, classifier.evaluated
+    with instrumentation.document(pdf_path):
+        # Parse and classify once (or reuse the analysis shared with the 1B chunker)
+        analysis = document_engine.analyze(pdf_path, pages, classifier)
+    return analysis["title"], analysis["outline"], (classifier.skipped - skipped, classifier.evaluated - evaluated)
+
+
+def _stream_task(task):
+    """
+    Worker entry point for streaming mode: writes the JSON Lines output of one PDF.
+    """
+    pdf_path, output_path = task
+    write_outline_jsonl(pdf_path, output_path)
+
+
+def _load_worker_model():
+    heading_classifier.get_classifier(config.MODEL_PATH)
+
+
+def _fingerprint(pdf_path: str, model_fingerprint: str, code_digest: str) -> dict:
+    return {
+        "inputs": {os.path.basename(pdf_path): hashing.file_digest(pdf_path)},
+        "model": model_fingerprint,
+        "code": code_digest,
+    }
+
+
+def _stream_pdfs(input_files: list, workers: int):
+    # One task per document: page ranges would break the page-by-page stream
+    tasks = [
+        (os.path.join(config.INPUT_DIR, pdf_filename), _output_path(pdf_filename, stream=True))
+        for pdf_filename in input_files
+    ]
+    pool = parallel.create_pool(workers, initializer=_load_worker_model)
+    try:
+        parallel.map_tasks(pool, _stream_task, tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def process_pdfs(workers: int = 1, incremental: bool = False, stream: bool = False):
+    """
+    Processes all PDFs in the input directory and generates structured JSON output.
+
+    With `workers` > 1 the documents (and page ranges of large documents) are
+    processed in a pool of worker processes, each loading the model once.
+    With `incremental`, PDFs whose output was built from the same PDF, model
+    and code (according to the manifest) are skipped.
+    With `stream`, each PDF is processed page by page in constant memory and
+    written as JSON Lines (<name>.jsonl, see iter_outline).
+    """
     input_files = [f for f in os.listdir(config.INPUT_DIR) if f.endswith('.pdf')]
 
+    fingerprints = {}
+    if incremental:
+        run_manifest = manifest.Manifest()
+        # The classifier's fingerprint covers the model it evaluates and its cascade
+        model_fingerprint = heading_classifier.get_classifier(config.MODEL_PATH).fingerprint
+        code_digest = hashing.code_digest()
+        for pdf_filename in input_files:
+            pdf_path = os.path.join(config.INPUT_DIR, pdf_filename)
+            fingerprints[pdf_filename] = _fingerprint(pdf_path, model_fingerprint, code_digest)
+        pending = [
+            f for f in input_files
+            if not run_manifest.is_current(_output_path(f, stream), fingerprints[f])
+        ]
+        print(f"Incremental mode: {len(input_files) - len(pending)} unchanged, {len(pending)} to process.")
+        input_files = pending
+
+    if stream:
+        _stream_pdfs(input_files, workers)
+        if incremental:
+            for pdf_filename in input_files:
+                run_manifest.record(_output_path(pdf_filename, stream), fingerprints[pdf_filename])
+            run_manifest.save()
+        print(f"Processing complete, files are in '{config.OUTPUT_DIR}'.")
+        return
+
+    # One task per page range; small PDFs are a single task
+    tasks, task_files = [], []
     for pdf_filename in input_files:
         pdf_path = os.path.join(config.INPUT_DIR, pdf_filename)
-        output_path = os.path.join(config.OUTPUT_DIR, pdf_filename.replace('.pdf', '.json'))
-        
-        doc = fitz.open(pdf_path)
-        
-        # --- Title Extraction Logic ---
-        # A simple rule: find the largest text on the first page.
-        # This can be made more sophisticated.
-        title = ""
-        max_font_size_page1 = 0
-        if len(doc) > 0:
-            page1_blocks = doc[0].get_text("dict")["blocks"]
-            for block in page1_blocks:
-                 if 'lines' not in block: continue
-                 for line in block['lines']:
-                     for span in line['spans']:
-                         if span['size'] > max_font_size_page1:
-                             max_font_size_page1 = span['size']
-                             title = span['text'].strip()
-
-        # --- Outline Extraction Logic ---
-        outline = []
-        for page_num, page in enumerate(doc):
-            blocks = page.get_text("dict")["blocks"]
-            page_rect = page.rect
-            
-            font_sizes = [span['size'] for block in blocks if 'lines' in block for line in block['lines'] for span in line['spans']]
-            avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-
-            for block in blocks:
-                if 'lines' not in block: continue
-                for line in block['lines']:
-                    for span in line['spans']:
-                        text = span['text'].strip()
-                        if not text: continue
-                        
-                        features = feature_extractor.extract_features(
-                            span, page_rect.width, page_rect.height, avg_font_size
-                        )
-                        
-                        # Ensure features are in the same order as during training
-                        features_df = pd.DataFrame([features])[feature_names]
-                        
-                        # Predict the label
-                        prediction = model.predict(features_df)[0]
-                        
-                        if prediction in ["H1", "H2", "H3"]:
-                            outline.append({
-                                "level": prediction,
-                                "text": text,
-                                "page": page_num + 1 # Page numbers are 1-indexed in output
-                            })
-        
-        # Final JSON structure
-        result = {
-            "title": title,
-            "outline": outline
-        }
+        ranges = parallel.page_ranges(pdf_path) if parallel.resolve_workers(workers) > 1 else [None]
+        for pages in ranges:
+            tasks.append((pdf_path, pages))
+            task_files.append(pdf_filename)
+
+    pool = parallel.create_pool(workers, initializer=_load_worker_model)
+    try:
+        results = parallel.map_tasks(pool, _outline_task, tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Merge the page ranges of each PDF back together, in page order
+    documents = {}
+    skipped = evaluated = 0
+    for pdf_filename, (title, outline, (task_skipped, task_evaluated)) in zip(task_files, results):
+        document = documents.setdefault(pdf_filename, {"title": "", "outline": []})
+        document["title"] = document["title"] or title
+        document["outline"].extend(outline)
+        skipped += task_skipped
+        evaluated += task_evaluated
+
+    for pdf_filename, result in documents.items():
+        output_path = _output_path(pdf_filename)
         
         # Save the output JSON
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=4)
-        
-        doc.close()
-    
+        with instrumentation.document(pdf_filename), instrumentation.stage("write_json"):
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=4)
+        if incremental:
+            run_manifest.record(output_path, fingerprints[pdf_filename])
+
+    if incremental:
+        run_manifest.save()
+
+    if skipped:
+        print(f"Heading cascade: skipped {skipped} of {skipped + evaluated} model evaluations.")
     print(f"Processing complete, files are in '{config.OUTPUT_DIR}'.")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract the title and outline of every PDF in the input directory.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (0 = one per CPU)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="skip PDFs whose output is up to date with the PDF, model and code")
+    parser.add_argument('--stream', action='store_true',
+                        help="process PDFs page by page in constant memory and write JSON Lines output")
+    parser.add_argument('--profile', nargs='?', const=os.path.join(config.PROFILE_DIR, 'main.json'),
+                        help="record per-document stage timings and counters and save them as a JSON "
+                             "trace plus a Prometheus .prom file (default: cache/profiles/main.json)")
+    args = parser.parse_args()
+
+    if args.profile:
+        instrumentation.enable()
     if not os.path.exists(config.OUTPUT_DIR):
         os.makedirs(config.OUTPUT_DIR)
-    process_pdfs()
\ No newline at end of file
+    process_pdfs(workers=args.workers, incremental=args.incremental, stream=args.stream)
+    if args.profile:
+        instrumentation.dump(args.profile)
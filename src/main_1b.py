@@ -1,63 +1,129 @@
 # src/main_1b.py
+import argparse
 import json
 import os
 from datetime import datetime
+import numpy as np
+from . import bm25
+from . import config
+from . import dedup
 from . import document_parser
+from . import embedding_cache
+from . import hashing
+from . import instrumentation
+from . import manifest
+from . import parallel
+from . import ranking
 from . import semantic_analyzer
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-def run_challenge_1b(input_path: str, output_path: str):
-    # 1. Load Inputs
-    with open(input_path, 'r') as f:
-        input_data = json.load(f)
+# Path to the model you downloaded in Step 1
+EMBEDDING_MODEL_PATH = 'models/all-MiniLM-L6-v2'
 
-    pdf_filenames = [doc['filename'] for doc in input_data['documents']]
-    persona = input_data['persona']['role']
-    job_to_be_done = input_data['job_to_be_done']
-    pdf_folder = os.path.join(os.path.dirname(input_path), "PDFs")
+# Chunks embedded and scored together in streaming mode
+STREAM_BATCH_SIZE = 256
 
-    # 2. Initialize Analyzer
-    # Path to the model you downloaded in Step 1
-    model_path = 'models/all-MiniLM-L6-v2' 
-    analyzer = semantic_analyzer.SemanticAnalyzer(model_path)
+def _fingerprint(input_path: str, pdf_paths: list, model_path: str, dedup: bool) -> dict:
+    """
+    Everything a collection's output depends on: its input JSON, its PDFs,
+    both models (the heading model with its cascade), the code and whether
+    the chunks were deduplicated.
+    """
+    heading_model = document_parser.get_heading_model()
+    fingerprint = {
+        "inputs": {
+            path: hashing.file_digest(path)
+            for path in [input_path] + pdf_paths if os.path.exists(path)
+        },
+        "model": {
+            "heading": heading_model.fingerprint if heading_model is not None else None,
+            "embedding": embedding_cache.model_fingerprint(model_path),
+        },
+        "code": hashing.code_digest(),
+    }
+    # The prefilter changes the rankings, so its pool size is an input too
+    if config.LEXICAL_CANDIDATES:
+        fingerprint["lexical_candidates"] = config.LEXICAL_CANDIDATES
+    # So does dedup (it is on by default, but streaming skips it)
+    if not dedup:
+        fingerprint["dedup"] = False
+    return fingerprint
 
-    # 3. Process all PDFs to get chunks
-    all_chunks = []
-    for filename in pdf_filenames:
-        full_pdf_path = os.path.join(pdf_folder, filename)
-        chunks = document_parser.parse_pdf_to_chunks(full_pdf_path)
-        all_chunks.extend(chunks)
 
-    # 4. Generate Query Embedding
-    query_text = f"{persona}: {job_to_be_done}"
-    query_embedding = analyzer.get_embedding(query_text)
+_ANALYZERS = {}
 
-    # 5. Score all Chunks
-    for chunk in all_chunks:
-        chunk_embedding = analyzer.get_embedding(chunk['content'])
-        chunk['relevance_score'] = analyzer.get_similarity(query_embedding, chunk_embedding)
 
-    # 6. Rank Chunks and Sections
-    # Sort all chunks by relevance for the 'subsection_analysis'
-    all_chunks.sort(key=lambda x: x['relevance_score'], reverse=True)
-    
-    # Aggregate scores to rank the parent headings for 'extracted_sections'
-    heading_scores = {}
-    for chunk in all_chunks:
-        heading = chunk['parent_heading']
-        score = chunk['relevance_score']
-        if heading not in heading_scores or score > heading_scores[heading]['relevance_score']:
-             heading_scores[heading] = {
-                 'relevance_score': score,
-                 'source_pdf': chunk['source_pdf'],
-                 'page_number': chunk['page_number']
-             }
-
-    ranked_headings = sorted(heading_scores.items(), key=lambda item: item[1]['relevance_score'], reverse=True)
-
-    # 7. Assemble and Save Final Output
-    output_json = {
+def get_analyzer(model_path: str = EMBEDDING_MODEL_PATH):
+    """
+    Returns a process-wide SemanticAnalyzer (with the shared embedding cache),
+    loading the sentence-transformer model on first use.
+    """
+    analyzer = _ANALYZERS.get(model_path)
+    if analyzer is None:
+        with instrumentation.stage("load_embedding_model"):
+            analyzer = _ANALYZERS[model_path] = semantic_analyzer.SemanticAnalyzer(
+                model_path,
+                cache_dir=config.EMBEDDING_CACHE_DIR,
+                cache_size=config.EMBEDDING_CACHE_SIZE,
+                backend=config.EMBEDDING_BACKEND,
+                threads=config.EMBEDDING_THREADS,
+                tokens_per_batch=config.EMBEDDING_TOKENS_PER_BATCH,
+            )
+    return analyzer
+
+
+def collection_queries(input_data: dict) -> list:
+    """
+    The (persona, job_to_be_done) pairs of a challenge1b_input.json.
+
+    Besides the single top-level "persona"/"job_to_be_done", an input may
+    carry a "queries" list of objects with the same two keys; all of them
+    are answered against one parse and embedding of the documents; an
+    empty list is rejected with ValueError.
+    """
+    if 'queries' in input_data:
+        if not input_data['queries']:
+            raise ValueError("'queries' must contain at least one persona/job_to_be_done query")
+        return [(query['persona']['role'], query['job_to_be_done']) for query in input_data['queries']]
+    return [(input_data['persona']['role'], input_data['job_to_be_done'])]
+
+
+def _rank_sections(all_chunks: list, heading_ids: np.ndarray, scores: np.ndarray, k: int = 10):
+    """
+    Top-k chunk indices, and for the top-k parent headings the index of their
+    best chunk. A heading's score is the score of its best chunk (the first
+    one on ties); headings with equal scores are ordered by the position of
+    their best chunk, as the original loop over score-sorted chunks did.
+    """
+    # Only the top k chunks are needed for 'subsection_analysis', so partially sort
+    top_chunks = ranking.top_k(scores, k)
+    if len(all_chunks) == 0:
+        return top_chunks, []
+
+    # Best chunk of every heading: first row per heading after sorting by
+    # (heading, score descending, position)
+    order = np.lexsort((np.arange(len(scores)), -scores, heading_ids))
+    sorted_ids = heading_ids[order]
+    best_chunks = order[np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1]))]
+    # Ties go to the heading whose best chunk comes first
+    ranked = best_chunks[np.lexsort((best_chunks, -scores[best_chunks]))]
+    return top_chunks, ranked[:k]
+
+
+def _with_locations(entry: dict, chunk: dict) -> dict:
+    """
+    Adds the document and page of every copy of a chunk that had duplicates
+    (see dedup.py).
+    """
+    if len(chunk.get('locations', ())) > 1:
+        entry["locations"] = chunk['locations']
+    return entry
+
+
+def _build_output(pdf_filenames: list, persona: str, job_to_be_done, all_chunks: list,
+                  top_chunks, best_heading_chunks) -> dict:
+    return {
         "metadata": {
             "input_documents": pdf_filenames,
             "persona": persona,
@@ -65,30 +131,249 @@ def run_challenge_1b(input_path: str, output_path: str):
             "processing_timestamp": datetime.utcnow().isoformat()
         },
         "extracted_sections": [
-            {
-                "document": details['source_pdf'],
-                "section_title": heading,
-                "importance_rank": i + 1,
-                "page_number": details['page_number']
-            } for i, (heading, details) in enumerate(ranked_headings[:10]) # Get top 10 sections
+            _with_locations({
+                "document": all_chunks[i]['source_pdf'],
+                "section_title": all_chunks[i]['parent_heading'],
+                "importance_rank": rank + 1,
+                "page_number": all_chunks[i]['page_number']
+            }, all_chunks[i]) for rank, i in enumerate(best_heading_chunks) # Top 10 sections
         ],
         "subsection_analysis": [
-            {
-                "document": chunk['source_pdf'],
-                "refined_text": chunk['content'],
-                "page_number": chunk['page_number']
-            } for chunk in all_chunks[:10] # Get top 10 subsections
+            _with_locations({
+                "document": all_chunks[i]['source_pdf'],
+                "refined_text": all_chunks[i]['content'],
+                "page_number": all_chunks[i]['page_number']
+            }, all_chunks[i]) for i in top_chunks # Top 10 subsections
         ]
     }
+
+
+def rank_collection_queries(input_data: dict, pdf_folder: str, analyzer, pool=None, use_cache: bool = False,
+                            candidates: int = None, stats: dict = None) -> list:
+    """
+    Builds one Challenge 1B output per query (see collection_queries) for a
+    parsed challenge1b_input.json, whose documents are looked up in
+    `pdf_folder`. Documents are parsed and embedded once for all queries.
+
+    With config.DEDUP_ENABLED, page furniture and duplicate chunks are
+    dropped first (see dedup.py), so each distinct text is embedded and
+    ranked once. With `candidates` > 0 (default config.LEXICAL_CANDIDATES),
+    only the union of each query's `candidates` best chunks by BM25 (see
+    bm25.py) is embedded and ranked. `stats`, if given, receives the number
+    of chunks, of embedded chunks and of chunks removed by dedup.
+    """
+    pdf_filenames = [doc['filename'] for doc in input_data['documents']]
+    queries = collection_queries(input_data)
+    pdf_paths = [os.path.join(pdf_folder, filename) for filename in pdf_filenames]
+
+    # 3. Process all PDFs to get chunks
+    with instrumentation.stage("parse_documents"):
+        all_chunks = document_parser.parse_pdfs_to_chunks(pdf_paths, pool=pool, use_cache=use_cache)
+
+    # Drop page furniture and collapse duplicate chunks
+    removed = {}
+    if config.DEDUP_ENABLED:
+        with instrumentation.stage("dedup"):
+            all_chunks, removed = dedup.dedup_chunks(all_chunks)
+        for kind, count in removed.items():
+            instrumentation.count(f"dedup_{kind}", count)
+
+    # 4. Generate Query Embeddings, all in one batch
+    with instrumentation.stage("encode_queries"):
+        query_embeddings = analyzer.encode([f"{persona}: {job_to_be_done}" for persona, job_to_be_done in queries])
+
+    # Optionally narrow the chunks down to a lexical candidate pool
+    candidates = config.LEXICAL_CANDIDATES if candidates is None else candidates
+    with instrumentation.stage("lexical_prefilter"):
+        pool_indices = bm25.candidate_pool(
+            all_chunks, [f"{persona}: {job_to_be_done}" for persona, job_to_be_done in queries], candidates
+        )
+    if stats is not None:
+        stats.update(chunks=len(all_chunks), embedded=len(pool_indices), removed=removed)
+
+    # 5. Score all Chunks
+    # Embed every chunk in batches and score every query against the corpus with one matrix product
+    with instrumentation.stage("encode_chunks"):
+        chunk_embeddings = analyzer.encode([all_chunks[i]['content'] for i in pool_indices])
+    with instrumentation.stage("score"):
+        scores = chunk_embeddings @ query_embeddings.T
+
+    # 6. Rank Chunks and Sections
+    heading_lookup = {}
+    heading_ids = np.array(
+        [heading_lookup.setdefault(chunk['parent_heading'], len(heading_lookup)) for chunk in all_chunks],
+        dtype=np.int64,
+    )
+    outputs = []
+    for query_index, (persona, job_to_be_done) in enumerate(queries):
+        with instrumentation.stage("rank"):
+            # Rank within the pool (in document order), then map back to chunk indices
+            top_chunks, best_heading_chunks = _rank_sections(pool_indices, heading_ids[pool_indices], scores[:, query_index])
+            top_chunks, best_heading_chunks = pool_indices[top_chunks], pool_indices[best_heading_chunks]
+        # 7. Assemble Final Output
+        outputs.append(_build_output(
+            pdf_filenames, persona, job_to_be_done, all_chunks, top_chunks, best_heading_chunks
+        ))
+    instrumentation.count("queries", len(queries))
+    return outputs
+
+
+def rank_collection_stream(input_data: dict, pdf_folder: str, analyzer, k: int = 10,
+                           batch_size: int = STREAM_BATCH_SIZE) -> list:
+    """
+    Streaming counterpart of rank_collection_queries: chunks are produced
+    page by page (document_parser.iter_chunks), embedded and scored in
+    batches of `batch_size`, and only bounded top-k heaps of chunks and
+    sections are kept per query, so memory does not grow with the size of
+    the documents. Produces the same rankings.
+    """
+    pdf_filenames = [doc['filename'] for doc in input_data['documents']]
+    queries = collection_queries(input_data)
+    with instrumentation.stage("encode_queries"):
+        query_embeddings = analyzer.encode([f"{persona}: {job_to_be_done}" for persona, job_to_be_done in queries])
+
+    top_chunks = [ranking.StreamingTopK(k) for _ in queries]
+    top_sections = [ranking.StreamingTopGroups(k) for _ in queries]
+    seen = 0
+
+    def score_batch(batch):
+        with instrumentation.stage("encode_chunks"):
+            embeddings = analyzer.encode([chunk['content'] for chunk in batch])
+        with instrumentation.stage("score"):
+            scores = embeddings @ query_embeddings.T
+        with instrumentation.stage("rank"):
+            for query_index in range(len(queries)):
+                query_scores = scores[:, query_index]
+                top_chunks[query_index].push_many(query_scores, seen, batch)
+                for i, (chunk, score) in enumerate(zip(batch, query_scores.tolist())):
+                    top_sections[query_index].push(score, seen + i, chunk['parent_heading'], chunk)
+
+    batch = []
+    for filename in pdf_filenames:
+        for chunk in document_parser.iter_chunks(os.path.join(pdf_folder, filename)):
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                score_batch(batch)
+                seen += len(batch)
+                batch = []
+    if batch:
+        score_batch(batch)
+
+    outputs = []
+    for query_index, (persona, job_to_be_done) in enumerate(queries):
+        sections = top_sections[query_index].items()
+        chunks = top_chunks[query_index].items()
+        # _build_output takes indices into one chunk list: the sections, then the chunks
+        kept = sections + chunks
+        outputs.append(_build_output(
+            pdf_filenames, persona, job_to_be_done, kept,
+            range(len(sections), len(kept)), range(len(sections)),
+        ))
+    instrumentation.count("queries", len(queries))
+    return outputs
+
+
+def rank_collection(input_data: dict, pdf_folder: str, analyzer, pool=None, use_cache: bool = False) -> dict:
+    """
+    Builds the Challenge 1B output for a single-query challenge1b_input.json.
+    """
+    return rank_collection_queries(input_data, pdf_folder, analyzer, pool=pool, use_cache=use_cache)[0]
+
+
+def query_output_paths(output_path: str, n_queries: int) -> list:
+    """
+    One output file per query: the given path for a single query, otherwise
+    numbered files next to it (collection_1_output_1.json, ...).
+    """
+    if n_queries == 1:
+        return [output_path]
+    stem, extension = os.path.splitext(output_path)
+    return [f"{stem}_{i + 1}{extension}" for i in range(n_queries)]
+
+
+def run_challenge_1b(input_path: str, output_path: str, pool=None, run_manifest=None, analyzer=None,
+                     stream: bool = False):
+    """
+    Ranks the sections of one collection for each of its persona/job queries.
+
+    `pool` is an optional worker pool (see parallel.create_pool) used to
+    parse the collection's PDFs in parallel. When a manifest is given
+    (incremental mode), up-to-date outputs are left as is and per-document
+    chunks are reused from the chunk cache. The embedding model is loaded
+    once per process (see get_analyzer) unless an `analyzer` is passed.
+    With `stream`, the collection is ranked in constant memory (see
+    rank_collection_stream); the pool, the chunk cache and dedup are not used.
+    """
+    # 1. Load Inputs
+    with open(input_path, 'r') as f:
+        input_data = json.load(f)
+
+    pdf_folder = os.path.join(os.path.dirname(input_path), "PDFs")
+    output_paths = query_output_paths(output_path, len(collection_queries(input_data)))
+
+    incremental = run_manifest is not None
+    if incremental:
+        pdf_paths = [os.path.join(pdf_folder, doc['filename']) for doc in input_data['documents']]
+        fingerprint = _fingerprint(input_path, pdf_paths, EMBEDDING_MODEL_PATH,
+                                   dedup=config.DEDUP_ENABLED and not stream)
+        if all(run_manifest.is_current(path, fingerprint) for path in output_paths):
+            print(f"{output_path} is up to date, skipping {input_path}")
+            return
+
+    # 2. Initialize Analyzer
+    if analyzer is None:
+        analyzer = get_analyzer()
+
+    if stream:
+        outputs = rank_collection_stream(input_data, pdf_folder, analyzer)
+    else:
+        stats = {}
+        outputs = rank_collection_queries(input_data, pdf_folder, analyzer, pool=pool, use_cache=incremental,
+                                          stats=stats)
+        if stats['removed']:
+            removed = stats['removed']
+            print(f"Dedup: removed {removed['furniture']} page furniture, {removed['exact']} exact and "
+                  f"{removed['near']} near duplicate chunk(s), {stats['chunks']} left")
     
-    with open(output_path, 'w') as f:
-        json.dump(output_json, f, indent=4)
+    for path, output_json in zip(output_paths, outputs):
+        with instrumentation.stage("write_json"), open(path, 'w') as f:
+            json.dump(output_json, f, indent=4)
+        if incremental:
+            run_manifest.record(path, fingerprint)
+
+    if incremental:
+        run_manifest.save()
+
+    analyzer.flush_cache()
+    if analyzer.cache is not None:
+        stats = analyzer.cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
     
-    print(f"Successfully processed {input_path} and saved output to {output_path}")
+    print(f"Successfully processed {input_path} and saved {len(outputs)} output(s) to {output_paths[0]}")
 
 # Example of how to run it
 # NEW CODE - USE THIS
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run Challenge 1B on every collection in Challenge_1b/.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes used to parse PDFs (0 = one per CPU)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="skip collections whose output is up to date and reuse per-document chunks")
+    parser.add_argument('--stream', action='store_true',
+                        help="rank each collection page by page in constant memory")
+    parser.add_argument('--candidates', type=int, default=config.LEXICAL_CANDIDATES,
+                        help="embed only each query's N best chunks by BM25 (0 = all chunks)")
+    parser.add_argument('--no-dedup', action='store_true',
+                        help="embed every chunk, including page furniture and duplicates")
+    parser.add_argument('--profile', nargs='?', const=os.path.join(config.PROFILE_DIR, 'main_1b.json'),
+                        help="record per-document stage timings and counters and save them as a JSON "
+                             "trace plus a Prometheus .prom file (default: cache/profiles/main_1b.json)")
+    args = parser.parse_args()
+    config.LEXICAL_CANDIDATES = args.candidates
+    config.DEDUP_ENABLED = not args.no_dedup
+    if args.profile:
+        instrumentation.enable()
+
     # Define the base directory for the challenge collections
     collections_base_dir = os.path.join(PROJECT_ROOT, 'Challenge_1b')
     output_base_dir = os.path.join(PROJECT_ROOT, 'output_1b')
@@ -101,6 +386,10 @@ if __name__ == '__main__':
 
     print(f"Found collections: {collection_folders}")
 
+    # One worker pool is shared by all collections
+    pool = parallel.create_pool(args.workers)
+    run_manifest = manifest.Manifest() if args.incremental else None
+
     # Loop through each collection and process it
     for folder_name in collection_folders:
         print(f"\n--- Processing {folder_name} ---")
@@ -113,8 +402,14 @@ if __name__ == '__main__':
         output_filename = os.path.join('output_1b', f'{safe_output_name}_output.json')
 
         try:
-            run_challenge_1b(input_filename, output_filename)
+            run_challenge_1b(input_filename, output_filename, pool=pool, run_manifest=run_manifest,
+                             stream=args.stream)
         except FileNotFoundError as e:
             print(f"Could not process {folder_name}. Error: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred while processing {folder_name}: {e}")
\ No newline at end of file
+            print(f"An unexpected error occurred while processing {folder_name}: {e}")
+
+    if pool is not None:
+        pool.shutdown()
+    if args.profile:
+        instrumentation.dump(args.profile)
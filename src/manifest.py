@@ -0,0 +1,38 @@
+# src/manifest.py
+
+import json
+import os
+
+from . import config
+from . import disk_cache
+
+
+class Manifest:
+    """
+    Records, for every output file, the fingerprint of everything it was
+    built from (input hashes, model hash, code hash and relevant config).
+
+    An output is up to date when it still exists and its recorded
+    fingerprint equals the current one.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.MANIFEST_PATH
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def _key(output_path: str) -> str:
+        return os.path.abspath(output_path)
+
+    def is_current(self, output_path: str, fingerprint: dict) -> bool:
+        return os.path.exists(output_path) and self.entries.get(self._key(output_path)) == fingerprint
+
+    def record(self, output_path: str, fingerprint: dict):
+        self.entries[self._key(output_path)] = fingerprint
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        disk_cache.write_atomic(self.path, lambda f: json.dump(self.entries, f, indent=2, sort_keys=True))
@@ -0,0 +1,301 @@
+# src/ocr.py
+
+import atexit
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import fitz  # PyMuPDF
+
+from . import config
+from . import disk_cache
+from . import instrumentation
+
+# Font name given to OCR spans (they carry no style flags)
+OCR_FONT = 'OCR'
+
+# Bump when the records produced for a page image change
+OCR_VERSION = 1
+
+_available = None
+
+# Worker pool shared by every document. A document that runs out of time
+# retires it (a new one is created on demand) and its workers are killed
+# once no other thread's document is still waiting on them
+_pool = None
+_pool_size = 0
+_pool_users = {}  # pool -> number of ocr_pages calls using it
+_pool_lock = threading.Lock()
+
+# Message of the RuntimeError pytesseract raises when tesseract is killed on timeout
+_TIMEOUT_MESSAGE = 'Tesseract process timeout'
+
+
+def is_available() -> bool:
+    """
+    True if OCR is enabled and pytesseract, Pillow and the tesseract binary are installed.
+    """
+    global _available
+    if not config.OCR_ENABLED:
+        return False
+    if _available is None:
+        try:
+            import pytesseract
+            import PIL  # noqa: F401  (pytesseract needs Pillow)
+            pytesseract.get_tesseract_version()
+            _available = True
+        except Exception:
+            _available = False
+    return _available
+
+
+def needs_ocr(page) -> bool:
+    """
+    A page without a usable text layer that has something to read: at least
+    one image (scans) or drawing (outlined text).
+    """
+    return bool(page.get_images(full=False)) or bool(page.get_drawings())
+
+
+def page_dpi(page) -> int:
+    """
+    Adaptive render resolution: the page's longest side is rendered at
+    config.OCR_TARGET_SIDE_PX pixels (300 DPI for US Letter), so small pages
+    get more detail and posters are not rendered huge, within
+    [OCR_MIN_DPI, OCR_MAX_DPI].
+    """
+    longest_side = max(page.rect.width, page.rect.height) or 1
+    dpi = config.OCR_TARGET_SIDE_PX * 72 / longest_side
+    return int(max(config.OCR_MIN_DPI, min(dpi, config.OCR_MAX_DPI)))
+
+
+def render_page(page, dpi: int) -> tuple:
+    """
+    Renders a page as a grayscale PNG. Returns (png bytes, image hash).
+    """
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    digest = hashlib.sha256()
+    digest.update(f"{pixmap.width}x{pixmap.height}@{dpi}|{config.OCR_LANGUAGE}|v{OCR_VERSION}".encode('utf-8'))
+    digest.update(pixmap.samples)
+    return pixmap.tobytes("png"), digest.hexdigest()
+
+
+def ocr_image(png: bytes, dpi: int, timeout: float = 0) -> list:
+    """
+    Runs tesseract on a page image and returns its text as blocks in the
+    shape of PyMuPDF's get_text("dict") blocks: one span per text line, with
+    its bbox in PDF points and a font size estimated from the line height.
+    """
+    import pytesseract
+    from PIL import Image
+
+    data = pytesseract.image_to_data(
+        Image.open(io.BytesIO(png)),
+        lang=config.OCR_LANGUAGE,
+        output_type=pytesseract.Output.DICT,
+        timeout=timeout,
+    )
+    scale = 72 / dpi
+    # Group the recognized words by (block, paragraph) and line, in reading order
+    lines = {}
+    for i, word in enumerate(data['text']):
+        if not word.strip() or float(data['conf'][i]) < config.OCR_MIN_CONFIDENCE:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        x0, y0 = data['left'][i], data['top'][i]
+        lines.setdefault(key, []).append((word, x0, y0, x0 + data['width'][i], y0 + data['height'][i]))
+
+    blocks = {}
+    for (block_num, par_num, _), words in lines.items():
+        x0 = min(w[1] for w in words) * scale
+        y0 = min(w[2] for w in words) * scale
+        x1 = max(w[3] for w in words) * scale
+        y1 = max(w[4] for w in words) * scale
+        span = {
+            'text': " ".join(w[0] for w in words),
+            'bbox': (x0, y0, x1, y1),
+            # Word boxes span roughly ascender to descender, i.e. about one em
+            'size': round(max(w[4] - w[2] for w in words) * scale * 2) / 2,
+            'flags': 0,
+            'font': OCR_FONT,
+        }
+        blocks.setdefault((block_num, par_num), []).append({'spans': [span]})
+    return [{'lines': block_lines} for block_lines in blocks.values()]
+
+
+def _cache_path(image_hash: str) -> str:
+    return os.path.join(config.OCR_CACHE_DIR, f"{image_hash}.json")
+
+
+def _load_cached(image_hash: str):
+    path = _cache_path(image_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store(image_hash: str, blocks: list):
+    os.makedirs(config.OCR_CACHE_DIR, exist_ok=True)
+    disk_cache.write_atomic(_cache_path(image_hash), lambda f: json.dump(blocks, f))
+
+
+class Budget:
+    """
+    OCR time allowed for one document. Only time spent waiting for OCR is
+    charged, so a budget can be carried across several ocr_pages calls
+    (e.g. one per page in layout.iter_pages).
+    """
+
+    def __init__(self, seconds: float = None):
+        self.seconds = config.OCR_TIME_BUDGET if seconds is None else seconds
+        self.spent = 0.0
+
+    def remaining(self) -> float:
+        return self.seconds - self.spent
+
+
+def _kill_if_unused(pool):
+    """
+    Kills the workers of a retired pool, including any still running a
+    page, once no call uses it. Callers hold _pool_lock.
+    """
+    if pool is not _pool and not _pool_users.get(pool):
+        _pool_users.pop(pool, None)
+        pool.terminate()
+        pool.join()
+
+
+def _acquire_pool(workers: int):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size < workers:
+            retired = _pool
+            _pool, _pool_size = multiprocessing.Pool(workers), workers
+            if retired is not None:
+                _kill_if_unused(retired)
+        _pool_users[_pool] = _pool_users.get(_pool, 0) + 1
+        return _pool
+
+
+def _release_pool(pool, retire: bool = False):
+    """
+    Ends one call's use of `pool`. With `retire` (the call ran out of time),
+    the pool is no longer handed out, so the pages still queued on it die
+    with it.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        _pool_users[pool] -= 1
+        if retire and pool is _pool:
+            _pool, _pool_size = None, 0
+        _kill_if_unused(pool)
+
+
+def _terminate_pools():
+    global _pool, _pool_size
+    with _pool_lock:
+        pools = set(_pool_users)
+        if _pool is not None:
+            pools.add(_pool)
+        for pool in pools:
+            pool.terminate()
+            pool.join()
+        _pool, _pool_size = None, 0
+        _pool_users.clear()
+
+
+atexit.register(_terminate_pools)
+
+
+def _ocr_task(task):
+    png, dpi, timeout = task
+    return ocr_image(png, dpi, timeout)
+
+
+def ocr_pages(doc, page_numbers: list, budget: Budget = None) -> dict:
+    """
+    OCRs the given pages of an open fitz document and returns
+    {page_num: blocks} (see ocr_image).
+
+    Pages are looked up in the OCR cache by the hash of their rendered image
+    first. The rest run in a shared pool of config.OCR_WORKERS processes and
+    are charged to `budget` (a new Budget of config.OCR_TIME_BUDGET seconds
+    by default); when it runs out the workers are killed and the remaining
+    pages are left out of the result, so callers can tell the document was
+    not fully read.
+    """
+    budget = budget or Budget()
+    results, pending = {}, []
+    for page_num in page_numbers:
+        page = doc[page_num]
+        dpi = page_dpi(page)
+        with instrumentation.stage("ocr_render"):
+            png, image_hash = render_page(page, dpi)
+        cached = _load_cached(image_hash)
+        if cached is not None:
+            instrumentation.count("ocr_cache_hits")
+            results[page_num] = cached
+        else:
+            pending.append((page_num, png, dpi, image_hash))
+    if not pending:
+        return results
+
+    started = time.monotonic()
+    deadline = started + budget.remaining()
+    workers = config.OCR_WORKERS if config.OCR_WORKERS > 0 else (os.cpu_count() or 1)
+    done = {}
+    with instrumentation.stage("ocr"):
+        if min(workers, len(pending)) <= 1:
+            for page_num, png, dpi, _ in pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    done[page_num] = ocr_image(png, dpi, timeout=remaining)
+                except Exception as e:
+                    # pytesseract's timeout means the budget is spent; any other
+                    # error (e.g. a TesseractError) only loses this page
+                    if str(e) == _TIMEOUT_MESSAGE or time.monotonic() >= deadline:
+                        break
+        elif deadline > started:
+            pool = _acquire_pool(workers)
+            timed_out = False
+            try:
+                remaining = deadline - time.monotonic()
+                tasks = {
+                    page_num: pool.apply_async(_ocr_task, ((png, dpi, remaining),))
+                    for page_num, png, dpi, _ in pending
+                }
+                for page_num, task in tasks.items():
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            raise multiprocessing.TimeoutError
+                        done[page_num] = task.get(timeout=remaining)
+                    except multiprocessing.TimeoutError:
+                        timed_out = True
+                        break
+                    except Exception:
+                        continue  # This page failed; the others may still succeed
+            finally:
+                # Pages still queued or running would keep the CPUs busy past the budget
+                _release_pool(pool, retire=timed_out)
+    budget.spent += time.monotonic() - started
+
+    instrumentation.count("ocr_pages", len(done))
+    skipped = len(pending) - len(done)
+    if skipped:
+        print(f"Warning: OCR failed or ran out of time, {skipped} page(s) left without text")
+    for page_num, _, _, image_hash in pending:
+        if page_num in done:
+            _store(image_hash, done[page_num])
+            results[page_num] = done[page_num]
+    return results
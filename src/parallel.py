@@ -0,0 +1,63 @@
+# src/parallel.py
+
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+from . import instrumentation
+from . import layout as document_layout
+
+
+def resolve_workers(workers: int) -> int:
+    """
+    Maps a --workers value to a process count; 0 or less means one per CPU.
+    """
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def create_pool(workers: int, initializer=None, initargs=()):
+    """
+    Returns a process pool for `workers` > 1, or None to run in-process.
+
+    `initializer` runs once per worker process, e.g. to load the heading model.
+    """
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+
+
+def map_tasks(pool, func, tasks: list) -> list:
+    """
+    Runs func over tasks and returns the results in task order, so merging
+    them is deterministic regardless of which worker finishes first.
+    """
+    if pool is None:
+        return [func(task) for task in tasks]
+    if instrumentation.is_enabled():
+        # Bring the workers' timings and counters back into this process
+        results = []
+        for result, records in pool.map(functools.partial(instrumentation.run_profiled, func), tasks):
+            instrumentation.merge(records)
+            results.append(result)
+        return results
+    return list(pool.map(func, tasks))
+
+
+def page_ranges(pdf_path: str, pages_per_task: int = None) -> list:
+    """
+    Splits a PDF into (start, stop) page ranges of at most `pages_per_task`
+    pages, so a very large document is spread over several workers.
+
+    Returns [None] (meaning "the whole document") when no split is needed.
+    """
+    pages_per_task = pages_per_task or config.PAGES_PER_TASK
+    n_pages = document_layout.page_count(pdf_path)
+    if n_pages <= pages_per_task:
+        return [None]
+    return [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)]
@@ -0,0 +1,113 @@
+# src/ranking.py
+
+import heapq
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+
+    Uses a partial sort (argpartition) so only the selected k are ordered;
+    ties keep their original (lowest index first) order.
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # argpartition picks arbitrary members of a tie at the k-th score, so
+        # take everything above it and fill up with the earliest tied indices
+        kth_score = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth_score)
+        tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.concatenate((above, tied))
+    else:
+        candidates = np.arange(n)
+    # Sort the selected indices by (score descending, index ascending)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+class StreamingTopK:
+    """
+    The k highest-scoring items of a stream, in bounded memory.
+
+    Items are pushed with a sequence number (their position in the stream);
+    like top_k, ties keep the earliest item.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []  # Min-heap of (score, -seq, item); seqs are unique so items are never compared
+
+    def threshold(self) -> float:
+        """
+        Scores at or below this cannot enter the top k.
+        """
+        if self.k <= 0:
+            return np.inf
+        return self._heap[0][0] if len(self._heap) >= self.k else -np.inf
+
+    def push(self, score: float, seq: int, item):
+        if self.k <= 0:
+            return
+        entry = (score, -seq, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def push_many(self, scores: np.ndarray, first_seq: int, items: list):
+        """
+        Pushes a batch of consecutive items, skipping those that cannot qualify.
+        """
+        for i in np.flatnonzero(scores >= self.threshold()):
+            self.push(float(scores[i]), first_seq + int(i), items[i])
+
+    def items(self) -> list:
+        """
+        The kept items, best first.
+        """
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+class StreamingTopGroups:
+    """
+    The k best groups of a stream of scored items (e.g. the top sections of
+    a stream of chunks), where a group's score is that of its best item.
+
+    Matches the batch ranking in main_1b: a group is represented by its
+    first item with the highest score, and groups with equal scores are
+    ordered by the sequence number of that item. Only the k current
+    leaders are kept.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._leaders = {}  # group -> (score, -seq, item)
+
+    def push(self, score: float, seq: int, group, item):
+        if self.k <= 0:
+            return
+        entry = (score, -seq, item)
+        current = self._leaders.get(group)
+        if current is not None:
+            if score > current[0]:
+                self._leaders[group] = entry
+            return
+        if len(self._leaders) < self.k:
+            self._leaders[group] = entry
+            return
+        # A group evicted here may come back later with a better item
+        weakest = min(self._leaders, key=lambda g: self._leaders[g][:2])
+        if entry[:2] > self._leaders[weakest][:2]:
+            del self._leaders[weakest]
+            self._leaders[group] = entry
+
+    def items(self) -> list:
+        """
+        The best item of each kept group, best group first.
+        """
+        return [item for _, _, item in sorted(self._leaders.values(), key=lambda e: e[:2], reverse=True)]
@@ -3,12 +3,54 @@ from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+from . import embedding_cache
+from . import instrumentation
+from . import ranking
+
+DEFAULT_BATCH_SIZE = 64
+
+# Padded tokens per batch when inputs are bucketed by length
+DEFAULT_TOKENS_PER_BATCH = 8192
+
+BACKENDS = ('float32', 'int8')
+
 class SemanticAnalyzer:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 cache_dir: str = None, cache_size: int = 0, backend: str = 'float32',
+                 threads: int = None, tokens_per_batch: int = DEFAULT_TOKENS_PER_BATCH):
         """
         Initializes the analyzer by loading the offline sentence-transformer model.
+
+        If `cache_dir` is given (and `cache_size` > 0), embeddings produced by
+        encode() are persisted there and reused across runs.
+
+        `backend` 'int8' applies dynamic int8 quantization to the model's
+        Linear layers (CPU only). `threads` sets the torch CPU thread count.
+        With `tokens_per_batch` > 0, encode() sorts inputs by token length and
+        sizes each batch so it holds about that many padded tokens.
         """
-        self.model = SentenceTransformer(model_path)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+
+        self.model = SentenceTransformer(model_path, device='cpu' if backend == 'int8' else None)
+        if backend == 'int8':
+            import torch
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.backend = backend
+        self.batch_size = batch_size
+        self.tokens_per_batch = tokens_per_batch
+        self.cache = None
+        if cache_dir and cache_size > 0:
+            self.cache = embedding_cache.EmbeddingCache(
+                cache_dir,
+                # Quantized models produce different vectors, so they get their own cache
+                embedding_cache.model_fingerprint(model_path, extra=backend),
+                self.model.get_sentence_embedding_dimension(),
+                cache_size,
+            )
 
     def get_embedding(self, text: str) -> np.ndarray:
         """
@@ -23,4 +65,111 @@ class SemanticAnalyzer:
         # Reshape for sklearn's cosine_similarity function
         emb1 = embedding1.reshape(1, -1)
         emb2 = embedding2.reshape(1, -1)
-        return cosine_similarity(emb1, emb2)[0][0]
\ No newline at end of file
+        return cosine_similarity(emb1, emb2)[0][0]
+
+    def encode(self, texts: list, batch_size: int = None) -> np.ndarray:
+        """
+        Encodes a list of texts in batches into L2-normalized float32 embeddings.
+
+        Returns an (n, dim) array, so cosine similarity reduces to a dot product.
+        With a cache configured, only texts not seen before reach the model.
+        Passing `batch_size` uses fixed-size batches instead of length buckets.
+        """
+        if self.cache is None:
+            return self._encode_texts(texts, batch_size)
+
+        keys = [embedding_cache.text_key(text) for text in texts]
+        embeddings = np.empty((len(texts), self.cache.dim), dtype=np.float32)
+        with instrumentation.stage("embedding_cache_lookup"):
+            found = self.cache.get_many(keys)
+        instrumentation.count("embedding_cache_hits", len(found))
+        instrumentation.count("embedding_cache_misses", len(texts) - len(found))
+        for i, vector in found.items():
+            embeddings[i] = vector
+
+        # Encode each missing text once, even if it occurs several times
+        missing = {}
+        for i, key in enumerate(keys):
+            if i not in found:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            missing_keys = list(missing)
+            missing_texts = [embedding_cache.normalize_text(texts[missing[key][0]]) for key in missing_keys]
+            new_embeddings = self._encode_texts(missing_texts, batch_size)
+            self.cache.put_many(missing_keys, new_embeddings)
+            for key, vector in zip(missing_keys, new_embeddings):
+                embeddings[missing[key]] = vector
+        return embeddings
+
+    def flush_cache(self):
+        """
+        Persists the embedding cache, if one is configured.
+        """
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _encode_texts(self, texts: list, batch_size: int = None) -> np.ndarray:
+        if not texts:
+            dim = self.model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype=np.float32)
+        instrumentation.count("embeddings", len(texts))
+        with instrumentation.stage("embed"):
+            if self.tokens_per_batch and batch_size is None:
+                return self._encode_bucketed(texts)
+            return self._encode_batch(texts, batch_size or self.batch_size)
+
+    def token_lengths(self, texts: list) -> np.ndarray:
+        """
+        Number of tokens the model sees for each text (after truncation).
+        """
+        encoded = self.model.tokenizer(
+            list(texts), add_special_tokens=True, truncation=True, max_length=self.model.max_seq_length
+        )
+        return np.array([len(ids) for ids in encoded['input_ids']], dtype=np.int64)
+
+    def _encode_bucketed(self, texts: list) -> np.ndarray:
+        """
+        Encodes texts sorted by token length, in batches of roughly
+        `tokens_per_batch` padded tokens, so short texts are not padded to
+        the length of long ones and short-text batches can be large.
+        """
+        with instrumentation.stage("tokenize"):
+            lengths = self.token_lengths(texts)
+        order = np.argsort(lengths, kind='stable')
+        embeddings = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        start = 0
+        while start < len(order):
+            # Batches grow until the longest (last) text times the batch size hits the budget
+            stop = start + 1
+            while stop < len(order) and lengths[order[stop]] * (stop + 1 - start) <= self.tokens_per_batch:
+                stop += 1
+            batch = order[start:stop]
+            embeddings[batch] = self._encode_batch([texts[i] for i in batch], len(batch))
+            start = stop
+        return embeddings
+
+    def _encode_batch(self, texts: list, batch_size: int) -> np.ndarray:
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+    @staticmethod
+    def score(query_embedding: np.ndarray, corpus_embeddings: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of one normalized query against every row of a
+        normalized corpus matrix, computed as a single matrix-vector product.
+        """
+        return corpus_embeddings @ np.asarray(query_embedding, dtype=corpus_embeddings.dtype).ravel()
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k highest scores, best first (see ranking.top_k).
+        """
+        return ranking.top_k(scores, k)
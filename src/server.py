@@ -0,0 +1,241 @@
+# src/server.py
+
+import argparse
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config
+from . import document_parser
+from . import heading_classifier
+from . import main
+from . import main_1b
+from . import parallel
+
+# Number of recent requests per endpoint kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+
+class LatencyStats:
+    """
+    Thread-safe per-endpoint request counts and latency percentiles.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}
+        self._counts = {}
+        self._errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self._window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {}
+            for endpoint, samples in self._samples.items():
+                ordered = sorted(samples)
+                summary[endpoint] = {
+                    "requests": self._counts[endpoint],
+                    "errors": self._errors.get(endpoint, 0),
+                    "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+                    "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+                    "max_ms": round(ordered[-1] * 1000, 2),
+                }
+            return summary
+
+
+def _percentile(ordered: list, percent: float) -> float:
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class InferenceService:
+    """
+    Holds the warm models and answers outline and Challenge 1B requests.
+    """
+
+    def __init__(self, workers: int = 1):
+        self.classifier = heading_classifier.get_classifier(config.MODEL_PATH)
+        document_parser.get_heading_model()
+        self.analyzer = main_1b.get_analyzer()
+        self.pool = parallel.create_pool(workers)
+        self.stats = LatencyStats()
+
+    def outline(self, request: dict = None, pdf_bytes: bytes = None) -> dict:
+        """
+        Title and outline of a PDF given by {"path": ...} or as raw bytes.
+        """
+        if pdf_bytes is None:
+            return main.process_pdf(_require_path(request, 'path', os.path.isfile), self.classifier)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(pdf_bytes)
+        try:
+            return main.process_pdf(f.name, self.classifier)
+        finally:
+            os.unlink(f.name)
+
+    def challenge_1b(self, request: dict) -> dict:
+        """
+        Challenge 1B output for a challenge1b_input.json document. The PDFs
+        are looked up in request["pdf_dir"]; an input with a "queries" list
+        gets {"results": [one output per query]}.
+        """
+        pdf_folder = _require_path(request, 'pdf_dir', os.path.isdir)
+        _require(request, 'documents')
+        try:
+            main_1b.collection_queries(request)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        except (KeyError, TypeError) as e:
+            raise BadRequest(f"malformed persona/job_to_be_done: {e}")
+        results = main_1b.rank_collection_queries(request, pdf_folder, self.analyzer, pool=self.pool)
+        self.analyzer.flush_cache()
+        # A multi-query input gets one result per query
+        return {"results": results} if 'queries' in request else results[0]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.analyzer.flush_cache()
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _require(request: dict, key: str):
+    if not request or key not in request:
+        raise BadRequest(f"missing '{key}'")
+    return request[key]
+
+
+def _require_path(request: dict, key: str, exists) -> str:
+    """
+    request[key], which must name an existing file or directory (`exists`
+    is os.path.isfile or os.path.isdir). Checked up front so that a missing
+    input is a bad request, while a missing file inside the pipeline is a
+    server error.
+    """
+    path = _require(request, key)
+    if not isinstance(path, str) or not exists(path):
+        raise BadRequest(f"'{key}' not found: {path}")
+    return path
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        POST /outline       {"path": ...} or a raw body with Content-Type application/pdf
+        POST /challenge1b   challenge1b_input.json plus "pdf_dir"
+        GET  /stats         request counts and latency percentiles
+        GET  /health
+    Every response carries its processing time in X-Processing-Time-Ms.
+    """
+
+    service = None  # Set by serve()
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {"status": "ok"})
+        elif self.path == '/stats':
+            self._send(200, self.service.stats.summary())
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {'/outline': self._outline, '/challenge1b': self._challenge_1b}
+        handler = routes.get(self.path)
+        if handler is None:
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            status, body = 200, handler()
+        except BadRequest as e:
+            status, body = 400, {"error": str(e)}
+        except json.JSONDecodeError as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        elapsed = time.perf_counter() - start
+        self.service.stats.record(self.path, elapsed, ok=status == 200)
+        self._send(status, body, elapsed)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def _outline(self) -> dict:
+        body = self._read_body()
+        if self.headers.get('Content-Type', '').startswith('application/pdf'):
+            return self.service.outline(pdf_bytes=body)
+        return self.service.outline(json.loads(body or b'{}'))
+
+    def _challenge_1b(self) -> dict:
+        return self.service.challenge_1b(json.loads(self._read_body() or b'{}'))
+
+    def _send(self, status: int, body: dict, elapsed: float = 0.0):
+        payload = json.dumps(body, indent=4).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-Processing-Time-Ms', f"{elapsed * 1000:.2f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, unix_socket: str = None, workers: int = 1):
+    """
+    Loads both models once and serves requests until interrupted.
+    """
+    RequestHandler.service = InferenceService(workers)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, RequestHandler)
+        where = unix_socket
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        where = f"http://{host}:{port}"
+
+    print(f"Serving outline and Challenge 1B requests on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        RequestHandler.service.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve outline and Challenge 1B requests from warm models.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix-socket', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes used to parse PDFs (0 = one per CPU)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.unix_socket, args.workers)
@@ -0,0 +1,121 @@
+# src/synthetic_pdf.py
+
+import json
+import os
+import random
+
+import fitz  # PyMuPDF
+
+# Base-14 fonts usable without embedding; headings use the bold faces
+BODY_FONTS = ['tiro', 'helv', 'cour', 'tiit', 'heit']
+HEADING_FONTS = ['hebo', 'tibo', 'cobo']
+HEADING_SIZES = {'H1': 18, 'H2': 15, 'H3': 13}
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter
+MARGIN = 72
+
+VOCABULARY = (
+    "analysis system document section report process data model result value method "
+    "design review quality project service user network policy market travel recipe "
+    "guide form signature export share history culture city restaurant hotel budget "
+    "summary overview introduction background requirement testing release planning "
+    "the of and to in for with on by from as at is are be this that which"
+).split()
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def _wrap(text: str, font_size: float, width: float) -> list:
+    # Rough average glyph width of the base-14 fonts
+    max_chars = max(10, int(width / (font_size * 0.5)))
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > max_chars:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def generate_pdf(path: str, pages: int = 10, heading_density: float = 0.15, font_variety: int = 2,
+                 words_per_page: int = 350, seed: int = 0) -> dict:
+    """
+    Writes a synthetic PDF and returns its ground truth in the samples/*.json
+    format ({"title", "outline": [{"level", "text", "page"}]}, with 0-based
+    pages as in samples/).
+
+    Args:
+        pages: Number of pages.
+        heading_density: Probability that a paragraph is preceded by a heading.
+        font_variety: Number of distinct body fonts used (1-5).
+        words_per_page: Approximate amount of body text per page.
+        seed: Seed of the deterministic content generator.
+    """
+    rng = random.Random(seed)
+    body_fonts = BODY_FONTS[:max(1, min(font_variety, len(BODY_FONTS)))]
+    doc = fitz.open()
+    title = f"Synthetic Report {seed}"
+    outline = []
+    heading_counts = {'H1': 0, 'H2': 0, 'H3': 0}
+
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN
+        if page_num == 0:
+            page.insert_text((MARGIN, y + 24), title, fontsize=24, fontname='hebo')
+            y += 48
+
+        words_on_page = 0
+        while words_on_page < words_per_page:
+            if rng.random() < heading_density:
+                level = rng.choice(list(HEADING_SIZES))
+                heading_counts[level] += 1
+                text = f"{heading_counts[level]}. {_sentence(rng, rng.randint(2, 5))[:-1]}"
+                size = HEADING_SIZES[level]
+                if y + size * 2 > PAGE_HEIGHT - MARGIN:
+                    break
+                page.insert_text((MARGIN, y + size), text, fontsize=size, fontname=rng.choice(HEADING_FONTS))
+                outline.append({"level": level, "text": text, "page": page_num})
+                y += size * 2
+
+            size = rng.choice([9.5, 10, 10.5, 11])
+            n_words = rng.randint(30, 90)
+            lines = _wrap(" ".join(_sentence(rng, rng.randint(6, 14)) for _ in range(n_words // 10 + 1)),
+                          size, PAGE_WIDTH - 2 * MARGIN)
+            line_height = size * 1.3
+            room = int((PAGE_HEIGHT - MARGIN - y) // line_height)
+            if room < 2:
+                break
+            lines = lines[:room]
+            page.insert_text((MARGIN, y + size), lines, fontsize=size, fontname=rng.choice(body_fonts),
+                             lineheight=1.3)
+            y += line_height * len(lines) + size
+            words_on_page += sum(len(line.split()) for line in lines)
+
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return {"title": title, "outline": outline}
+
+
+def generate_corpus(directory: str, documents: int = 3, with_ground_truth: bool = True, **options) -> list:
+    """
+    Generates `documents` PDFs (synthetic_000.pdf, ...) in `directory`, each
+    with its ground-truth JSON next to it. Returns the PDF paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    seed = options.pop('seed', 0)
+    pdf_paths = []
+    for i in range(documents):
+        pdf_path = os.path.join(directory, f"synthetic_{i:03d}.pdf")
+        ground_truth = generate_pdf(pdf_path, seed=seed + i, **options)
+        if with_ground_truth:
+            with open(pdf_path.replace('.pdf', '.json'), 'w', encoding='utf-8') as f:
+                json.dump(ground_truth, f, indent=4)
+        pdf_paths.append(pdf_path)
+    return pdf_paths
@@ -4,21 +4,32 @@ import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+import argparse
 import joblib
 import os
 
+from . import cascade
 from . import config
+from . import feature_store
+from . import forest_engine
 
-def train():
+def train(from_shards: bool = False, n_jobs: int = None):
     """
     Trains the heading classification model and saves it.
+
+    With `from_shards` the data is read from the feature store (see
+    feature_store.build_store) instead of the training CSV. The forest is
+    fitted on `n_jobs` cores (default config.TRAINING_JOBS).
     """
-    # Load data
-    df = pd.read_csv(config.TRAINING_DATA_PATH)
-    
-    # Define features (X) and target (y)
-    X = df.drop('label', axis=1)
-    y = df['label']
+    if from_shards:
+        X, y = feature_store.load_dataset()
+    else:
+        # Load data
+        df = pd.read_csv(config.TRAINING_DATA_PATH)
+
+        # Define features (X) and target (y)
+        X = df.drop('label', axis=1)
+        y = df['label']
 
     # Split data for training and testing
     X_train, X_test, y_train, y_test = train_test_split(
@@ -27,8 +38,13 @@ def train():
 
     # Initialize and train the model
     # RandomForest is a good choice for this kind of tabular data
-    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
+    model = RandomForestClassifier(
+        n_estimators=100, random_state=42, class_weight='balanced',
+        n_jobs=config.TRAINING_JOBS if n_jobs is None else n_jobs,
+    )
     model.fit(X_train, y_train)
+    # Fitting is parallel; keep inference with the saved model single-threaded
+    model.set_params(n_jobs=None)
 
     # Evaluate the model
     y_pred = model.predict(X_test)
@@ -41,6 +57,21 @@ def train():
     joblib.dump(model, config.MODEL_PATH)
     print(f"Definitive generic model trained and saved to {config.MODEL_PATH}")
 
+    # Export the dependency-free evaluator used at inference time
+    compiled_path = forest_engine.export_model(config.MODEL_PATH)
+    print(f"Compiled forest saved to {compiled_path}")
+
+    # Relearn the body-text cascade for the new model
+    report = cascade.build(config.MODEL_PATH)
+    print(f"Heading cascade saved to {config.HEADING_CASCADE_PATH} "
+          f"(skips {report['skipped']} of {report['rows']} sample evaluations)")
+
 
 if __name__ == '__main__':
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the heading classifier.")
+    parser.add_argument('--from-shards', action='store_true',
+                        help="train from the feature store instead of the training CSV")
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help="cores used to fit the forest (default: all)")
+    args = parser.parse_args()
+    train(from_shards=args.from_shards, n_jobs=args.n_jobs)
\ No newline at end of file
@@ -0,0 +1,379 @@
+# src/vector_index.py
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from . import config
+from . import disk_cache
+from . import hashing
+from . import ranking
+
+META_FILENAME = 'meta.json'
+CHUNKS_FILENAME = 'chunks.jsonl'
+ALIVE_FILENAME = 'alive.npy'
+SCALES_FILENAME = 'scales.f32'
+CENTROIDS_FILENAME = 'centroids.npy'
+LISTS_FILENAME = 'lists.i32'
+
+VECTOR_FILES = {'float16': 'vectors.f16', 'int8': 'vectors.i8'}
+
+# Rows decoded per block while scanning; small blocks stay in cache
+SCAN_BLOCK_ROWS = 2048
+
+# Chunk fields stored alongside each vector
+METADATA_FIELDS = ('source_pdf', 'page_number', 'parent_heading', 'content')
+
+
+class VectorIndex:
+    """
+    Persistent, memory-mapped store of chunk embeddings and their metadata.
+
+    Embeddings (L2-normalized) are stored quantized, either as float16 or as
+    int8 with one float32 scale per row, in an append-only file. Documents can
+    be added and removed; removed rows are tombstoned until compact().
+
+    Queries scan all live rows, or with an IVF layer (build_ivf) only the rows
+    of the `nprobe` clusters closest to the query.
+    """
+
+    def __init__(self, directory: str, dim: int = None, dtype: str = 'int8'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_path = self._path(META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        else:
+            if dim is None:
+                raise ValueError(f"{directory} holds no index; pass dim to create one")
+            if dtype not in VECTOR_FILES:
+                raise ValueError(f"Unsupported index dtype: {dtype}")
+            self.meta = {'dim': dim, 'dtype': dtype, 'n_rows': 0, 'documents': {}, 'ivf_lists': 0}
+
+        self.chunks = []
+        if os.path.exists(self._path(CHUNKS_FILENAME)):
+            with open(self._path(CHUNKS_FILENAME), 'r', encoding='utf-8') as f:
+                self.chunks = [json.loads(line) for line in f]
+        # Rows written after the last save() (e.g. by an interrupted add) are discarded
+        self._chunks_stale = len(self.chunks) != self.meta['n_rows']
+        del self.chunks[self.meta['n_rows']:]
+        alive_path = self._path(ALIVE_FILENAME)
+        self.alive = np.load(alive_path) if os.path.exists(alive_path) else np.zeros(0, dtype=bool)
+        self.centroids = None
+        if self.meta['ivf_lists']:
+            self.centroids = np.load(self._path(CENTROIDS_FILENAME))
+        self._map()
+
+    # --- Storage ---
+
+    @property
+    def dim(self) -> int:
+        return self.meta['dim']
+
+    @property
+    def dtype(self) -> str:
+        return self.meta['dtype']
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _memmap(self, name: str, dtype, width: int = None):
+        n_rows = self.meta['n_rows']
+        if n_rows == 0 or not os.path.exists(self._path(name)):
+            shape = (0, width) if width else (0,)
+            return np.empty(shape, dtype=dtype)
+        shape = (n_rows, width) if width else (n_rows,)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=shape)
+
+    def _map(self):
+        self.vectors = self._memmap(VECTOR_FILES[self.dtype], self.dtype, self.dim)
+        self.scales = self._memmap(SCALES_FILENAME, np.float32) if self.dtype == 'int8' else None
+        self.lists = self._memmap(LISTS_FILENAME, np.int32) if self.centroids is not None else None
+
+    def save(self):
+        # meta.json is written last: it commits the row count the other files are read with
+        disk_cache.write_atomic(self._path(ALIVE_FILENAME), lambda f: np.save(f, self.alive), binary=True)
+        disk_cache.write_atomic(self._path(META_FILENAME), lambda f: json.dump(self.meta, f, indent=2))
+
+    def _quantize(self, embeddings: np.ndarray):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.dtype == 'float16':
+            return embeddings.astype(np.float16), None
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(embeddings / scales[:, np.newaxis]).astype(np.int8), scales.astype(np.float32)
+
+    def _decode(self, rows) -> np.ndarray:
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[:, np.newaxis]
+        return vectors
+
+    # --- Documents ---
+
+    def has_document(self, key: str, digest: str = None) -> bool:
+        document = self.meta['documents'].get(key)
+        return document is not None and (digest is None or document['digest'] == digest)
+
+    def add_document(self, key: str, chunks: list, embeddings: np.ndarray, digest: str = ""):
+        """
+        Appends the chunks of one document (replacing any previous version).
+        """
+        if key in self.meta['documents']:
+            self.remove_document(key)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        vectors, scales = self._quantize(embeddings)
+
+        self._write_rows(VECTOR_FILES[self.dtype], vectors)
+        if scales is not None:
+            self._write_rows(SCALES_FILENAME, scales)
+        if self.centroids is not None:
+            self._write_rows(LISTS_FILENAME, self._assign(embeddings))
+        if self._chunks_stale:
+            self._rewrite_chunks()
+        with open(self._path(CHUNKS_FILENAME), 'a', encoding='utf-8') as f:
+            for chunk in chunks:
+                record = {field: chunk.get(field) for field in METADATA_FIELDS}
+                f.write(json.dumps(record) + '\n')
+                self.chunks.append(record)
+
+        start = self.meta['n_rows']
+        self.meta['n_rows'] += len(embeddings)
+        self.meta['documents'][key] = {'digest': digest, 'rows': [start, self.meta['n_rows']]}
+        self.alive = np.concatenate([self.alive, np.ones(len(embeddings), dtype=bool)])
+        self._map()
+
+    def _write_rows(self, name: str, array: np.ndarray):
+        """
+        Writes rows right after the last committed row of a column file.
+        """
+        path = self._path(name)
+        row_bytes = array.itemsize * (array.shape[1] if array.ndim == 2 else 1)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(self.meta['n_rows'] * row_bytes)
+            f.truncate()
+            f.write(array.tobytes())
+
+    def _rewrite_chunks(self):
+        disk_cache.write_atomic(
+            self._path(CHUNKS_FILENAME),
+            lambda f: f.writelines(json.dumps(record) + '\n' for record in self.chunks),
+        )
+        self._chunks_stale = False
+
+    def remove_document(self, key: str):
+        document = self.meta['documents'].pop(key, None)
+        if document is not None:
+            start, stop = document['rows']
+            self.alive[start:stop] = False
+
+    def compact(self):
+        """
+        Rewrites the index without the rows of removed documents.
+
+        Everything is computed before any file is touched; the data files
+        are replaced first and meta.json (which gives their row count) last.
+        """
+        keep = np.flatnonzero(self.alive)
+        # Live documents keep all their rows, so a document's new start is the
+        # number of kept rows before it (also right for documents without rows)
+        documents = {}
+        for key, document in self.meta['documents'].items():
+            start, stop = document['rows']
+            new_start = int(np.searchsorted(keep, start))
+            documents[key] = dict(document, rows=[new_start, new_start + (stop - start)])
+        arrays = {VECTOR_FILES[self.dtype]: np.asarray(self.vectors[keep])}
+        if self.scales is not None:
+            arrays[SCALES_FILENAME] = np.asarray(self.scales[keep])
+        if self.lists is not None:
+            arrays[LISTS_FILENAME] = np.asarray(self.lists[keep])
+        chunks = [self.chunks[row] for row in keep]
+        # Drop the memory maps before the files underneath are replaced
+        self.vectors = self.scales = self.lists = None
+
+        for name, array in arrays.items():
+            disk_cache.write_atomic(self._path(name), array.tofile, binary=True)
+        self.chunks = chunks
+        self._rewrite_chunks()
+
+        self.meta['documents'] = documents
+        self.meta['n_rows'] = len(keep)
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._map()
+        self.save()
+
+    # --- Approximate search ---
+
+    def build_ivf(self, n_lists: int, iterations: int = 10, sample_size: int = 50000, seed: int = 42):
+        """
+        Clusters the live rows with spherical k-means into `n_lists` lists.
+        Later queries with nprobe only scan the closest lists. An index with
+        no live rows has nothing to cluster; any previous IVF layer is dropped.
+        """
+        live = np.flatnonzero(self.alive)
+        if len(live) == 0:
+            self.centroids = None
+            self.meta['ivf_lists'] = 0
+            self._map()
+            self.save()
+            return
+        rng = np.random.default_rng(seed)
+        sample = live if len(live) <= sample_size else np.sort(rng.choice(live, sample_size, replace=False))
+        data = self._decode(sample)
+        # Initial centroids are distinct sample rows, so there are at most len(data) lists
+        n_lists = max(1, min(n_lists, len(data)))
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for j in range(n_lists):
+                members = data[assignment == j]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[j] = centroid / (np.linalg.norm(centroid) or 1)
+
+        self.centroids = centroids.astype(np.float32)
+        np.save(self._path(CENTROIDS_FILENAME), self.centroids)
+        lists = np.concatenate([
+            self._assign(self._decode(np.arange(start, min(start + SCAN_BLOCK_ROWS, self.meta['n_rows']))))
+            for start in range(0, self.meta['n_rows'], SCAN_BLOCK_ROWS)
+        ]) if self.meta['n_rows'] else np.empty(0, dtype=np.int32)
+        lists.tofile(self._path(LISTS_FILENAME))
+        self.meta['ivf_lists'] = len(self.centroids)
+        self._map()
+        self.save()
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.argmax(embeddings @ self.centroids.T, axis=1).astype(np.int32)
+
+    # --- Queries ---
+
+    def search(self, query_embedding: np.ndarray, k: int = 10, nprobe: int = None, sources=None) -> list:
+        """
+        Top-k chunks by cosine similarity to a normalized query embedding.
+
+        `nprobe` restricts the scan to the closest IVF lists (requires
+        build_ivf); `sources` optionally restricts results to some PDFs.
+        Returns chunk metadata dicts with a 'relevance_score'.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        mask = self.alive.copy()
+        if nprobe and self.centroids is not None:
+            probes = ranking.top_k(self.centroids @ query, nprobe)
+            mask &= np.isin(np.asarray(self.lists), probes)
+        if sources is not None:
+            allowed = np.zeros(len(mask), dtype=bool)
+            for source in sources:
+                document = self.meta['documents'].get(source)
+                if document:
+                    allowed[document['rows'][0]:document['rows'][1]] = True
+            mask &= allowed
+        candidates = np.flatnonzero(mask)
+
+        if len(candidates) > len(mask) // 2:
+            # Mostly a full scan: decode contiguous slices, which is much
+            # cheaper than gathering rows, then keep the candidate scores
+            all_scores = np.empty(len(mask), dtype=np.float32)
+            for start in range(0, len(mask), SCAN_BLOCK_ROWS):
+                block = slice(start, min(start + SCAN_BLOCK_ROWS, len(mask)))
+                all_scores[block] = self._decode(block) @ query
+            scores = all_scores[candidates]
+        else:
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), SCAN_BLOCK_ROWS):
+                block = candidates[start:start + SCAN_BLOCK_ROWS]
+                scores[start:start + len(block)] = self._decode(block) @ query
+
+        results = []
+        for i in ranking.top_k(scores, k):
+            record = dict(self.chunks[candidates[i]])
+            record['relevance_score'] = float(scores[i])
+            results.append(record)
+        return results
+
+
+def index_pdfs(index: VectorIndex, pdf_paths: list, analyzer) -> int:
+    """
+    Parses and embeds every PDF that is new or changed since it was indexed.
+    Documents are keyed by file name. Returns the number of documents indexed.
+    """
+    from . import document_parser
+
+    indexed = 0
+    for pdf_path in pdf_paths:
+        key = os.path.basename(pdf_path)
+        digest = hashing.file_digest(pdf_path)
+        if index.has_document(key, digest):
+            continue
+        chunks = document_parser.parse_pdf_to_chunks(pdf_path)
+        embeddings = analyzer.encode([chunk['content'] for chunk in chunks])
+        index.add_document(key, chunks, embeddings, digest)
+        indexed += 1
+    index.save()
+    return indexed
+
+
+def _expand_pdfs(paths: list) -> list:
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_paths.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.pdf'))
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Persistent vector index over parsed PDF chunks.")
+    parser.add_argument('--index', default=config.VECTOR_INDEX_DIR, help="index directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = commands.add_parser('add', help="index new or changed PDFs (files or folders)")
+    add_parser.add_argument('paths', nargs='+')
+    add_parser.add_argument('--dtype', choices=sorted(VECTOR_FILES), default='int8',
+                            help="storage type of new indexes (int8 scans faster, float16 is more precise)")
+
+    remove_parser = commands.add_parser('remove', help="remove documents by file name")
+    remove_parser.add_argument('names', nargs='+')
+
+    ivf_parser = commands.add_parser('build-ivf', help="cluster the index for approximate queries")
+    ivf_parser.add_argument('--lists', type=int, default=256)
+
+    query_parser = commands.add_parser('query', help="top-k chunks for a text query")
+    query_parser.add_argument('text')
+    query_parser.add_argument('--k', type=int, default=10)
+    query_parser.add_argument('--nprobe', type=int, help="scan only the closest IVF lists")
+
+    args = parser.parse_args()
+
+    if args.command in ('add', 'query'):
+        from . import main_1b
+        analyzer = main_1b.get_analyzer()
+
+    if args.command == 'add':
+        dim = analyzer.model.get_sentence_embedding_dimension()
+        index = VectorIndex(args.index, dim=dim, dtype=args.dtype)
+        indexed = index_pdfs(index, _expand_pdfs(args.paths), analyzer)
+        analyzer.flush_cache()
+        print(f"Indexed {indexed} document(s); {len(index)} chunks in {args.index}")
+    elif args.command == 'remove':
+        index = VectorIndex(args.index)
+        for name in args.names:
+            index.remove_document(name)
+        index.compact()
+        print(f"{len(index)} chunks left in {args.index}")
+    elif args.command == 'build-ivf':
+        index = VectorIndex(args.index)
+        index.build_ivf(args.lists)
+        print(f"Built {index.meta['ivf_lists']} IVF lists over {len(index)} chunks")
+    else:
+        index = VectorIndex(args.index)
+        query_embedding = analyzer.encode([args.text])[0]
+        for result in index.search(query_embedding, args.k, nprobe=args.nprobe):
+            print(f"{result['relevance_score']:.4f}  {result['source_pdf']} p.{result['page_number']}"
+                  f"  [{result['parent_heading']}]  {result['content'][:80]}")